@@ -91,7 +91,8 @@ def public_key_db(client_name):
     cursor.execute("""CREATE TABLE IF NOT EXISTS public_key(
                                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                                 username TEXT UNIQUE NOT NULL,
-                                public_key TEXT UNIQUE
+                                public_key TEXT UNIQUE,
+                                algorithm TEXT NOT NULL DEFAULT 'Kyber1024'
                             );
                             """)
     
@@ -7,6 +7,17 @@ app = Flask(__name__)
 
 DB_FILE = "users.db"
 PUBLIC_KEY_REGISTRY = "public_key.db" # encrpytion decrption pub key
+DEFAULT_KEM_ALGORITHM = "Kyber1024" # algorithm of keys registered before clients reported one
+
+
+def public_key_registry():
+    """Open the public key registry, adding the algorithm column to registries created without it."""
+    connection = sqlite3.connect(PUBLIC_KEY_REGISTRY)
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(public_key)")]
+    if columns and "algorithm" not in columns:
+        connection.execute(f"ALTER TABLE public_key ADD COLUMN algorithm TEXT NOT NULL DEFAULT '{DEFAULT_KEM_ALGORITHM}'")
+        connection.commit()
+    return connection
 
 
 @app.route('/auth', methods=['POST'])
@@ -58,6 +69,7 @@ def submit_public_key():
     data = request.json
     username = data.get("username")
     public_key = data.get("public_key")
+    algorithm = data.get("algorithm", DEFAULT_KEM_ALGORITHM)
     print(public_key)
 
     if not username:
@@ -65,11 +77,11 @@ def submit_public_key():
 
     try:
         # Connect to the database
-        connection = sqlite3.connect(PUBLIC_KEY_REGISTRY)
+        connection = public_key_registry()
         cursor = connection.cursor()
 
-        # Update the public key for the given username
-        cursor.execute("UPDATE public_key SET public_key = ? WHERE username = ?", (public_key, username))
+        # Update the public key and its KEM algorithm for the given username
+        cursor.execute("UPDATE public_key SET public_key = ?, algorithm = ? WHERE username = ?", (public_key, algorithm, username))
         connection.commit()
 
         if cursor.rowcount == 0:
@@ -97,16 +109,16 @@ def get_public_key():
 
     try:
         # Connect to the database
-        connection = sqlite3.connect(PUBLIC_KEY_REGISTRY)  # Ensure variable is correctly defined
+        connection = public_key_registry()
         cursor = connection.cursor()
 
-        # Retrieve the public key for the given username
-        cursor.execute("SELECT public_key FROM public_key WHERE username = ?", (receiver_name,))
+        # Retrieve the public key and its KEM algorithm for the given username
+        cursor.execute("SELECT public_key, algorithm FROM public_key WHERE username = ?", (receiver_name,))
         result = cursor.fetchone()
 
         if result is not None:  # Ensures we don't access NoneType
-            receiver_public_key = result[0]
-            return jsonify({'status': 'success', 'receiver_public_key': receiver_public_key}), 200
+            receiver_public_key, receiver_algorithm = result
+            return jsonify({'status': 'success', 'receiver_public_key': receiver_public_key, 'receiver_algorithm': receiver_algorithm}), 200
         else:
             return jsonify({'status': 'failure', 'message': 'Receiver not found'}), 404
 
@@ -0,0 +1,42 @@
+import json
+import os
+import platform
+
+
+def machine_info() -> dict:
+    """Describe the machine and Python the benchmark ran on."""
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def print_table(results:list, columns:list):
+    """
+    Print benchmark results as an aligned text table.
+
+    Args:
+        results: list of result dicts.
+        columns: keys to print, in order.
+    """
+    rows = [[f"{row[column]:.4f}" if isinstance(row[column], float) else str(row[column]) for column in columns] for row in results]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)).rstrip())
+    for row in rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+
+def write_json(data, path:str):
+    """
+    Write benchmark results as JSON to a file, or to stdout for '-'.
+
+    Args:
+        data: JSON-serializable results.
+        path: output path or '-'.
+    """
+    if path == "-":
+        print(json.dumps(data, indent=2))
+        return
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=2)
@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import steganographic as stegano
+
+
+COVER_EXTENSIONS = (".png", ".bmp", ".tif", ".tiff", ".webp", ".jpg", ".jpeg")
+INDEX_FILE = ".cover_index.db"
+
+
+class CoverLibrary:
+    """
+    Indexes a directory of cover images by adaptive capacity and picks the
+    smallest cover that fits a message.
+
+    The index is kept in a SQLite file inside the directory and only covers
+    that are new or changed since the last refresh are filtered again.
+    """
+
+    def __init__(self, directory:str, index_path:str = None):
+        """
+        Args:
+            directory: directory holding the cover images.
+            index_path: SQLite index file, defaults to INDEX_FILE inside the directory.
+        """
+        self.directory = directory
+        self.index_path = index_path or os.path.join(directory, INDEX_FILE)
+
+        connection = sqlite3.connect(self.index_path)
+        try:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS covers (
+                    path TEXT PRIMARY KEY,
+                    modified REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    width INTEGER NOT NULL,
+                    height INTEGER NOT NULL,
+                    payload_bytes INTEGER NOT NULL
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS covers_by_capacity ON covers (payload_bytes)")
+            connection.commit()
+        finally:
+            connection.close()
+
+    def refresh(self) -> int:
+        """
+        Bring the index in line with the directory.
+
+        Returns:
+            Number of covers whose capacity was (re)computed.
+        """
+        files = {}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.lower().endswith(COVER_EXTENSIONS) and os.path.isfile(path):
+                stat = os.stat(path)
+                files[path] = (stat.st_mtime, stat.st_size)
+
+        connection = sqlite3.connect(self.index_path)
+        try:
+            indexed = {path: (modified, size) for path, modified, size in connection.execute("SELECT path, modified, size FROM covers")}
+
+            stale = [path for path in indexed if path not in files]
+            connection.executemany("DELETE FROM covers WHERE path = ?", [(path,) for path in stale])
+
+            updated = 0
+            for path, (modified, size) in files.items():
+                if indexed.get(path) == (modified, size):
+                    continue
+                try:
+                    capacity_map = stegano.capacity(path)
+                except ValueError as e:
+                    print(f"[-] Skipping cover {path}: {e}")
+                    continue
+                height, width = capacity_map.shape
+                connection.execute(
+                    "INSERT OR REPLACE INTO covers (path, modified, size, width, height, payload_bytes) VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, modified, size, width, height, capacity_map.payload_bytes),
+                )
+                updated += 1
+            connection.commit()
+        finally:
+            connection.close()
+        return updated
+
+    def best_fit(self, payload_length:int):
+        """
+        Smallest indexed cover that can hold payload_length bytes.
+
+        Ties on capacity go to the cover with fewer pixels, which is the
+        cheapest to filter, encode and send.
+
+        Args:
+            payload_length: payload size in bytes, as embedded.
+
+        Returns:
+            Path of the cover, or None if no cover is large enough.
+        """
+        connection = sqlite3.connect(self.index_path)
+        try:
+            row = connection.execute(
+                "SELECT path FROM covers WHERE payload_bytes >= ? ORDER BY payload_bytes, width * height LIMIT 1",
+                (payload_length,),
+            ).fetchone()
+        finally:
+            connection.close()
+        return row[0] if row else None
+
+    def covers(self) -> list:
+        """
+        List the indexed covers as (path, width, height, payload_bytes), smallest capacity first.
+        """
+        connection = sqlite3.connect(self.index_path)
+        try:
+            return connection.execute("SELECT path, width, height, payload_bytes FROM covers ORDER BY payload_bytes").fetchall()
+        finally:
+            connection.close()
@@ -0,0 +1,113 @@
+import argparse
+import os
+import time
+import oqs
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from cryptographic import KEM_ALGORITHMS, derive_message_key
+from benchmark_report import machine_info, print_table, write_json
+
+
+def ops_per_second(function, seconds:float) -> float:
+    """
+    Call a function repeatedly for at least the given time.
+
+    Args:
+        function: zero-argument callable to measure.
+        seconds: minimum measuring time.
+
+    Returns:
+        Calls per second.
+    """
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        function()
+        count += 1
+        now = time.perf_counter()
+        if now >= deadline:
+            return count / (now - start)
+
+
+def benchmark_algorithm(algorithm:str, payload_size:int, seconds:float) -> list:
+    """
+    Measure keygen, encap, decap and message encryption for one KEM parameter set.
+
+    hkdf+aead is the per-message cost without a session, a key derivation
+    and one encryption; aead is the cost of a repeat message in a session.
+
+    Args:
+        algorithm: liboqs KEM algorithm name.
+        payload_size: message size in bytes for the AEAD measurements.
+        seconds: measuring time per operation.
+
+    Returns:
+        One dict per operation.
+    """
+    kem = oqs.KeyEncapsulation(algorithm)
+    public_key = kem.generate_keypair()
+    transmission_key, shared_secret_key = kem.encap_secret(public_key)
+
+    payload = os.urandom(payload_size)
+    nonce = os.urandom(12)
+    cipher = ChaCha20Poly1305(derive_message_key(shared_secret_key))
+
+    operations = {
+        "keygen": lambda: oqs.KeyEncapsulation(algorithm).generate_keypair(),
+        "encap": lambda: kem.encap_secret(public_key),
+        "decap": lambda: kem.decap_secret(transmission_key),
+        "hkdf+aead": lambda: ChaCha20Poly1305(derive_message_key(shared_secret_key)).encrypt(nonce, payload, None),
+        "aead": lambda: cipher.encrypt(nonce, payload, None),
+    }
+
+    details = kem.details
+    return [{
+        "algorithm": algorithm,
+        "operation": operation,
+        "ops_per_second": ops_per_second(function, seconds),
+        "public_key_bytes": details["length_public_key"],
+        "transmission_key_bytes": details["length_ciphertext"],
+    } for operation, function in operations.items()]
+
+
+def run_benchmark(algorithms:list, payload_size:int = 1024, seconds:float = 1.0) -> dict:
+    """
+    Run benchmark_algorithm() for every parameter set liboqs has enabled.
+
+    Args:
+        algorithms: KEM algorithm names; the ones missing from this liboqs build are skipped.
+        payload_size: message size in bytes for the AEAD measurements.
+        seconds: measuring time per operation.
+
+    Returns:
+        Machine description, skipped algorithms and the list of results, ready for JSON output.
+    """
+    enabled = set(oqs.get_enabled_kem_mechanisms())
+    results = []
+    for algorithm in algorithms:
+        if algorithm in enabled:
+            results.extend(benchmark_algorithm(algorithm, payload_size, seconds))
+
+    machine = dict(machine_info(), liboqs=oqs.oqs_version())
+    return {"machine": machine, "skipped": [algorithm for algorithm in algorithms if algorithm not in enabled], "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="StealthCode KEM and AEAD microbenchmark.")
+    parser.add_argument("--algorithms", nargs="+", default=KEM_ALGORITHMS, help="KEM parameter sets to measure")
+    parser.add_argument("--payload", type=int, default=1024, help="message size in bytes for the AEAD measurements")
+    parser.add_argument("--seconds", type=float, default=1.0, help="measuring time per operation")
+    parser.add_argument("--json", help="write results as JSON to this path, '-' for stdout")
+    args = parser.parse_args()
+
+    data = run_benchmark(args.algorithms, args.payload, args.seconds)
+    if args.json:
+        write_json(data, args.json)
+    if args.json != "-":
+        print_table(data["results"], ["algorithm", "operation", "ops_per_second", "public_key_bytes", "transmission_key_bytes"])
+        if data["skipped"]:
+            print(f"Not enabled in this liboqs build: {', '.join(data['skipped'])}")
+
+
+if __name__ == "__main__":
+    main()
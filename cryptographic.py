@@ -1,13 +1,289 @@
 import os
+import lzma
+import time
+import struct
+import zlib
+import threading
+from collections import OrderedDict, namedtuple
 import oqs
 from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives import hashes
 
+# KEM parameter set for new key pairs. Receivers publish theirs in the public key
+# registry and senders encapsulate with the receiver's, so deployments can mix levels.
+KEM_ALGORITHM = "Kyber1024"
+KEM_ALGORITHMS = ["ML-KEM-512", "ML-KEM-768", "ML-KEM-1024", "Kyber512", "Kyber768", "Kyber1024"]
+
+# Codec byte in front of a compressed plaintext
+CODEC_ZLIB = 1
+CODEC_LZMA = 2
+MAX_DECOMPRESSED_SIZE = 64 * 1024 * 1024 # bytes a received compressed plaintext may expand to
+
+# Outbound sessions: one KEM per receiver, reused until the epoch ends
+SESSION_LIFETIME = 60 * 60 # seconds
+SESSION_MESSAGES = 1 << 20 # messages, well below the 96-bit nonce counter limit
+INBOUND_SESSIONS = 256 # decapsulated transmission keys kept by the receiver
+
+# Result of CryptographicFunctions.encrypt(); everything the receiver needs besides the ciphertext
+EncryptedMessage = namedtuple("EncryptedMessage", ["ciphertext", "transmission_key", "tag", "compressed"])
+
+# Chunked AEAD stream: header with a random salt and the segment size, then
+# segments of segment size plaintext plus the Poly1305 tag each. The last
+# segment may be shorter and is marked in its nonce.
+STREAM_SEGMENT_SIZE = 64 * 1024
+STREAM_HEADER_FORMAT = ">16sI"
+STREAM_HEADER_SIZE = struct.calcsize(STREAM_HEADER_FORMAT)
+STREAM_TAG_SIZE = 16
+
+
+def compress_payload(data:bytes):
+    """
+    Compress a plaintext with the best stdlib codec, only when it helps.
+
+    Args:
+        data: plaintext bytes.
+
+    Returns:
+        Codec byte followed by the compressed data, or None if no codec makes
+        the payload smaller.
+    """
+    candidates = [
+        bytes([CODEC_ZLIB]) + zlib.compress(data, 9),
+        bytes([CODEC_LZMA]) + lzma.compress(data, preset=6),
+    ]
+    best = min(candidates, key=len)
+    return best if len(best) < len(data) else None
+
+
+def decompress_payload(data:bytes, max_length:int = MAX_DECOMPRESSED_SIZE) -> bytes:
+    """
+    Undo compress_payload().
+
+    The payload is chosen by whoever encapsulated to our public key, which
+    anyone can, so the output is capped instead of trusting the sender.
+
+    Args:
+        data: codec byte followed by the compressed data.
+        max_length: largest plaintext accepted, in bytes.
+
+    Raises:
+        ValueError: unknown codec, truncated data, or a plaintext larger than max_length.
+    """
+    if data[0] == CODEC_ZLIB:
+        decompressor = zlib.decompressobj()
+    elif data[0] == CODEC_LZMA:
+        decompressor = lzma.LZMADecompressor()
+    else:
+        raise ValueError(f"Unknown payload codec {data[0]}.")
+
+    # One byte over the limit tells an oversized payload from one that fits exactly
+    plaintext = decompressor.decompress(data[1:], max_length + 1)
+    if len(plaintext) > max_length:
+        raise ValueError(f"Decompressed payload exceeds {max_length} bytes.")
+    if not decompressor.eof:
+        raise ValueError("Compressed payload is truncated.")
+    return plaintext
+
+
+def derive_message_key(shared_secret_key:bytes) -> bytes:
+    """
+    Derive the ChaCha20-Poly1305 key from a KEM shared secret.
+
+    Args:
+        shared_secret_key: shared secret from encapsulation or decapsulation.
+    """
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,  # ChaCha20-Poly1305 requires a 256-bit key
+        salt=None,
+        info=b''  # Explicitly set info to an empty bytes object
+    ).derive(shared_secret_key)
+
+
+def iter_segments(source, segment_size:int):
+    """
+    Yield (segment, last) pairs of a bytes-like or file-like source.
+
+    Reads one segment ahead so the last segment is known when it is yielded.
+    An empty source yields a single empty last segment.
+
+    Args:
+        source: bytes-like object, or file-like object with read().
+        segment_size: segment size in bytes.
+    """
+    if hasattr(source, "read"):
+        segments = iter(lambda: source.read(segment_size), b"")
+    else:
+        data = memoryview(source).cast("B")
+        segments = (data[offset:offset + segment_size] for offset in range(0, len(data), segment_size))
+
+    segment = next(segments, b"")
+    for following in segments:
+        yield segment, False
+        segment = following
+    yield segment, True
+
+
+def stream_nonce(counter:int, last:bool) -> bytes:
+    """
+    Nonce of one stream segment: 88-bit segment counter and the final-segment flag.
+
+    Args:
+        counter: segment index.
+        last: whether this is the last segment.
+    """
+    return counter.to_bytes(11, "big") + (b"\x01" if last else b"\x00")
+
+
+def stream_key(mainkey:bytes, salt:bytes) -> bytes:
+    """
+    Derive the key of one stream from the message key and the stream salt.
+
+    Every stream gets its own key, so segment nonces never collide with the
+    counter nonces of session messages under the same message key.
+
+    Args:
+        mainkey: message key from derive_message_key().
+        salt: random salt from the stream header.
+    """
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=b"StealthCode stream").derive(mainkey)
+
+
+def stream_ciphertext_size(plaintext_size:int, segment_size:int = STREAM_SEGMENT_SIZE) -> int:
+    """
+    Size in bytes of the stream encrypt_stream() produces for a plaintext.
+
+    Args:
+        plaintext_size: plaintext size in bytes.
+        segment_size: segment size in bytes.
+    """
+    segments = max(1, -(-plaintext_size // segment_size))
+    return STREAM_HEADER_SIZE + plaintext_size + segments * STREAM_TAG_SIZE
+
+
+class Session:
+    """
+    One KEM epoch with a receiver: the transmission key, the derived message
+    key and a message counter used as the nonce.
+
+    Every message of the session is encrypted under the same key, so the nonce
+    must never repeat; the counter guarantees that without random nonces.
+    """
+
+    def __init__(self, transmission_key:bytes, shared_secret_key:bytes):
+        """
+        Args:
+            transmission_key: KEM ciphertext the receiver decapsulates.
+            shared_secret_key: the encapsulated shared secret.
+        """
+        self.transmission_key = transmission_key
+        self.shared_secret_key = shared_secret_key
+        self.mainkey = derive_message_key(shared_secret_key)
+        self.cipher = ChaCha20Poly1305(self.mainkey)
+        self.created = time.monotonic()
+        self.counter = 0
+
+    def expired(self, lifetime:float, max_messages:int) -> bool:
+        """
+        Whether the epoch is over and a new KEM is due.
+
+        Args:
+            lifetime: session lifetime in seconds.
+            max_messages: messages allowed per session.
+        """
+        return self.counter >= max_messages or time.monotonic() - self.created >= lifetime
+
+    def next_nonce(self) -> bytes:
+        """
+        Take the next 96-bit counter nonce.
+        """
+        nonce = self.counter.to_bytes(12, "big")
+        self.counter += 1
+        return nonce
+
+
+class SessionCache:
+    """
+    Caches KEM results on both ends of the channel.
+
+    The sender keeps one Session per receiver public key, so a repeat message
+    to the same receiver costs a ChaCha20-Poly1305 call instead of an
+    encapsulation and HKDF. The receiver keeps the cipher of every recently
+    seen transmission key, so it decapsulates once per session.
+
+    Messages keep the existing key file format (transmission key and nonce),
+    which old receivers still decrypt.
+    """
+
+    def __init__(self, lifetime:float = SESSION_LIFETIME, max_messages:int = SESSION_MESSAGES, max_inbound:int = INBOUND_SESSIONS):
+        """
+        Args:
+            lifetime: outbound session lifetime in seconds.
+            max_messages: messages per outbound session.
+            max_inbound: inbound sessions kept, least recently used are dropped.
+        """
+        self.lifetime = lifetime
+        self.max_messages = max_messages
+        self.max_inbound = max_inbound
+        self.outbound = {} # receiver public key -> Session
+        self.inbound = OrderedDict() # transmission key -> ChaCha20Poly1305
+        self.lock = threading.Lock()
+
+    def outbound_session(self, kem, receiver_public_key:bytes):
+        """
+        Take the next message slot of the session with a receiver, starting a
+        new session when there is none or its epoch is over.
+
+        Args:
+            kem: oqs.KeyEncapsulation used for a new encapsulation.
+            receiver_public_key: public key of the receiver.
+
+        Returns:
+            (session, nonce) for one message.
+        """
+        with self.lock:
+            session = self.outbound.get(receiver_public_key)
+            if session is None or session.expired(self.lifetime, self.max_messages):
+                session = Session(*kem.encap_secret(receiver_public_key))
+                self.outbound[receiver_public_key] = session
+            return session, session.next_nonce()
+
+    def inbound_cipher(self, kem, transmission_key:bytes) -> ChaCha20Poly1305:
+        """
+        Cipher for a received transmission key, decapsulating only on first sight.
+
+        Args:
+            kem: oqs.KeyEncapsulation holding the receiver's secret key.
+            transmission_key: KEM ciphertext from the key file.
+        """
+        with self.lock:
+            cipher = self.inbound.get(transmission_key)
+            if cipher is not None:
+                self.inbound.move_to_end(transmission_key)
+                return cipher
+
+        cipher = ChaCha20Poly1305(derive_message_key(kem.decap_secret(transmission_key)))
+        with self.lock:
+            self.inbound[transmission_key] = cipher
+            while len(self.inbound) > self.max_inbound:
+                self.inbound.popitem(last=False)
+        return cipher
+
+    def clear(self):
+        """
+        Drop every session, forcing a new KEM for the next message.
+        """
+        with self.lock:
+            self.outbound.clear()
+            self.inbound.clear()
+
+
 class CryptographicFunctions: 
 
-    def __init__(self):
-        self.kem = oqs.KeyEncapsulation("Kyber1024")
+    def __init__(self, algorithm:str = None):
+        self.algorithm = algorithm or KEM_ALGORITHM
+        self.kem = oqs.KeyEncapsulation(self.algorithm)
         self.publickey = None # transmission
         self.privatekey = None
         self.ciphertext = None # transmission
@@ -17,6 +293,11 @@ class CryptographicFunctions:
         self.transmission_key = None # transmission
         self.tag = None # transmission
         self.mainkey = None
+        self.compressed = False # whether the last encrypted payload was compressed
+        self.sessions = SessionCache() # KEM results reused per receiver and per transmission key
+        self.cipher = None # cipher of the current outbound session
+        self.local = threading.local() # per-thread KEM instances, see thread_kem() and thread_encapsulator()
+        self.key_generation_count = 0 # bumped on every key pair change to refresh the thread KEMs
 
     def generate_key_pairs(self):
 
@@ -27,18 +308,126 @@ class CryptographicFunctions:
             self:
         """
 
+        self.kem = oqs.KeyEncapsulation(self.algorithm)
         self.publickey = self.kem.generate_keypair()
         self.privatekey = self.kem.export_secret_key()
+        self.key_generation_count += 1
+
+    def load_key_pairs(self, public_key:bytes, secret_key:bytes):
+
+        """
+        Use a stored key pair instead of generating a new one.
+
+        Args:
+            public_key: the stored public key.
+            secret_key: the stored secret key, imported into the KEM for decapsulation.
+        """
+
+        self.kem = oqs.KeyEncapsulation(self.algorithm, secret_key=secret_key)
+        self.publickey = public_key
+        self.privatekey = secret_key
+        self.key_generation_count += 1
+
+    def thread_kem(self):
+
+        """
+        KEM instance of the calling thread, holding the current secret key.
+
+        liboqs objects are not safe to share between threads, so every thread
+        gets its own, created on first use and again after a key pair change.
+        """
+
+        local = self.local
+        if getattr(local, "key_generation_count", None) != self.key_generation_count:
+            local.kem = oqs.KeyEncapsulation(self.algorithm, secret_key=self.privatekey)
+            local.key_generation_count = self.key_generation_count
+        return local.kem
+
+    def thread_encapsulator(self, algorithm:str = None):
+
+        """
+        KEM instance of the calling thread for encapsulating to a receiver.
+
+        Args:
+            algorithm: the receiver's KEM algorithm, defaults to our own.
+        """
+
+        if not algorithm or algorithm == self.algorithm:
+            return self.thread_kem()
+        encapsulators = getattr(self.local, "encapsulators", None)
+        if encapsulators is None:
+            encapsulators = self.local.encapsulators = {}
+        if algorithm not in encapsulators:
+            encapsulators[algorithm] = oqs.KeyEncapsulation(algorithm)
+        return encapsulators[algorithm]
+
+    def transmission_key_size(self, algorithm:str = None) -> int:
+
+        """
+        Size in bytes of the transmission key (KEM ciphertext) of an algorithm.
+
+        Args:
+            algorithm: KEM algorithm, defaults to our own.
+        """
+
+        return self.thread_encapsulator(algorithm).details["length_ciphertext"]
+
+    def encrypt(self, payload, receiver_public_key, compress:bool = False, receiver_algorithm:str = None, compressed:bytes = None) -> EncryptedMessage:
+
+        """
+        Encrypt a message for a receiver without touching any instance state.
+
+        Safe to call from several threads at once; the session with the
+        receiver is shared and hands every call its own nonce.
+
+        Args:
+            payload: the message, str or bytes.
+            receiver_public_key: The public key of the receiver (Bob).
+            compress: compress the payload first when that makes it smaller.
+            receiver_algorithm: KEM algorithm of the receiver's key, defaults to our own.
+            compressed: compress_payload() of the payload when the caller already has it,
+                sent instead of compressing again.
+        """
+
+        session, nonce = self.sessions.outbound_session(self.thread_encapsulator(receiver_algorithm), receiver_public_key)
+        plaintext = payload.encode() if isinstance(payload, str) else bytes(payload)
+        if compressed is None and compress:
+            compressed = compress_payload(plaintext)
+        ciphertext = session.cipher.encrypt(nonce, compressed if compressed is not None else plaintext, None)
+        return EncryptedMessage(ciphertext, session.transmission_key, nonce, compressed is not None)
+
+    def decrypt(self, ciphertext, transmission_key, tag, compressed:bool = False) -> bytes:
+
+        """
+        Decrypt a message without touching any instance state.
+
+        Args:
+            ciphertext: text which is obtained after the stegnographic decoding
+            transmission_key: key transmitted to the reciever to generate shared secret key
+            tag: nonce value to check authenticity and integrity
+            compressed: the sender compressed the payload before encryption
+
+        Raises:
+            cryptography.exceptions.InvalidTag: the authenticity/integrity check failed.
+        """
+
+        chacha = self.sessions.inbound_cipher(self.thread_kem(), transmission_key)
+        plaintext = chacha.decrypt(tag, ciphertext, None)
+        return decompress_payload(plaintext) if compressed else plaintext
 
     def key_generation(self, receiver_public_key):
         """
-        Generate the transmission key and shared secret using the receiver's public key.
+        Take the transmission key, shared secret and nonce for a message to the receiver.
+
+        The KEM runs once per receiver per session epoch; the nonce is the
+        session's message counter.
 
         Args:
             receiver_public_key: The public key of the receiver (Bob).
         """
-        self.transmission_key, self.shared_secret_key = self.kem.encap_secret(receiver_public_key)
-        self.tag = os.urandom(12)
+        session, self.tag = self.sessions.outbound_session(self.thread_kem(), receiver_public_key)
+        self.transmission_key, self.shared_secret_key = session.transmission_key, session.shared_secret_key
+        self.mainkey, self.cipher = session.mainkey, session.cipher
 
     def key_prep(self):
 
@@ -50,29 +439,93 @@ class CryptographicFunctions:
         
         """
 
-        hkdf = HKDF(
-            algorithm=hashes.SHA256(),
-            length=32,  # ChaCha20-Poly1305 requires a 256-bit key
-            salt=None,  # Optionally, use a secure salt,
-            info=b''  # Explicitly set info to an empty bytes object
-        )
-        return hkdf.derive(self.shared_secret_key)
+        return derive_message_key(self.shared_secret_key)
 
 
-    def encrypt_msg(self):
+    def encrypt_msg(self, compress:bool = False):
 
         """
         Encrypts the message using the main key derived from the shared secret key
 
+        Not thread-safe, the result is kept on the instance; use encrypt() from worker threads.
+
         Args: 
             self:
+            compress: compress the payload first when that makes it smaller;
+                self.compressed tells the receiver to decompress.
         """
 
-        self.mainkey = self.key_prep()
-        chacha = ChaCha20Poly1305(self.mainkey)
-        self.ciphertext = chacha.encrypt(self.tag, self.payload.encode(), None)
+        chacha = self.cipher
+        plaintext = self.payload.encode()
+        compressed = compress_payload(plaintext) if compress else None
+        self.compressed = compressed is not None
+        self.ciphertext = chacha.encrypt(self.tag, compressed if self.compressed else plaintext, None)
 
-    def decryption_message(self, ciphertext, transmission_key, tag):
+    def encrypt_stream(self, source, receiver_public_key, segment_size:int = STREAM_SEGMENT_SIZE, receiver_algorithm:str = None):
+        """
+        Encrypt bytes or a file-like object for a receiver, segment by segment.
+
+        Memory use is one segment whatever the payload size, and segments can be
+        sent or embedded as they are produced.
+
+        Args:
+            source: bytes-like object, or file-like object with read().
+            receiver_public_key: The public key of the receiver (Bob).
+            segment_size: plaintext bytes per segment.
+            receiver_algorithm: KEM algorithm of the receiver's key, defaults to our own.
+
+        Returns:
+            (transmission_key, segments), where segments yields the stream
+            header, then every encrypted segment.
+        """
+        session, _ = self.sessions.outbound_session(self.thread_encapsulator(receiver_algorithm), receiver_public_key)
+        return session.transmission_key, self.stream_segments(source, session.mainkey, segment_size)
+
+    def stream_segments(self, source, mainkey:bytes, segment_size:int):
+        """
+        Yield the header and encrypted segments of a stream, see encrypt_stream().
+        """
+        salt = os.urandom(16)
+        chacha = ChaCha20Poly1305(stream_key(mainkey, salt))
+        yield struct.pack(STREAM_HEADER_FORMAT, salt, segment_size)
+
+        for counter, (segment, last) in enumerate(iter_segments(source, segment_size)):
+            yield chacha.encrypt(stream_nonce(counter, last), bytes(segment), None)
+
+    def decrypt_stream(self, source, transmission_key:bytes):
+        """
+        Decrypt a stream from encrypt_stream() segment by segment.
+
+        Args:
+            source: the stream as a bytes-like object, or file-like object with read().
+            transmission_key: key transmitted to the reciever to generate shared secret key
+
+        Yields:
+            Plaintext segments, each only after its tag was verified.
+
+        Raises:
+            cryptography.exceptions.InvalidTag: a segment was altered, reordered or dropped.
+            ValueError: the stream is truncated.
+        """
+        if hasattr(source, "read"):
+            header = source.read(STREAM_HEADER_SIZE)
+        else:
+            source = memoryview(source).cast("B")
+            header, source = source[:STREAM_HEADER_SIZE], source[STREAM_HEADER_SIZE:]
+        if len(header) < STREAM_HEADER_SIZE:
+            raise ValueError("Stream header is truncated.")
+        salt, segment_size = struct.unpack(STREAM_HEADER_FORMAT, header)
+
+        mainkey = derive_message_key(self.thread_kem().decap_secret(transmission_key))
+        chacha = ChaCha20Poly1305(stream_key(mainkey, salt))
+
+        # A missing last segment fails the tag check of the segment before it
+        for counter, (segment, last) in enumerate(iter_segments(source, segment_size + STREAM_TAG_SIZE)):
+            if len(segment) < STREAM_TAG_SIZE:
+                raise ValueError("Stream segment is truncated.")
+            yield chacha.decrypt(stream_nonce(counter, last), bytes(segment), None)
+
+    def decryption_message(self, ciphertext, transmission_key, tag, compressed=False):
         # recieves private key, performs key computation
 
         """
@@ -82,25 +535,11 @@ class CryptographicFunctions:
             ciphertext: text which is obtained after the stegnographic decoding
             transmission_key: key transmitted to the reciever to generate shared secret key
             tag: nonce value to check authenticity and integrity
+            compressed: the sender compressed the payload before encryption
 
         """
 
-        shared_secret_key = self.kem.decap_secret(transmission_key)
-        mainkey = HKDF(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=None,
-            info=b''  # Explicitly set info to an empty bytes object
-        ).derive(shared_secret_key)
-
-        chacha = ChaCha20Poly1305(mainkey)
-
         try:
-            plaintext = chacha.decrypt(tag, ciphertext, None)
-            return plaintext.decode()
+            return self.decrypt(ciphertext, transmission_key, tag, compressed).decode()
         except Exception as e:
             return f"Decryption failed (authenticity/integrity check failed): {str(e)}"
-        
-        
-    
-
@@ -3,12 +3,14 @@ import time
 import threading
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from networking import PARTIAL_SUFFIX
 
 
 class FileAddHandler(FileSystemEventHandler):
     """
     Custom event handler for file monitoring.
-    Triggers the decryption callback when a new file is created.
+    Triggers the decryption callback when a new file is created, or when a
+    file received by Networking is renamed into place once complete.
     """
 
     def __init__(self, decryption_callback):
@@ -27,12 +29,41 @@ class FileAddHandler(FileSystemEventHandler):
         Args:
             event (FileSystemEvent): The event object containing details about the file.
         """
-        if not event.is_directory:
+        if not event.is_directory and not event.src_path.endswith(PARTIAL_SUFFIX):
             print(f"[+] New file detected: {event.src_path}")
             # Wait for the file to be fully written before triggering the callback
             self.wait_for_file_completion(event.src_path)
             print("Calling Decrption call Back")
-            self.decryption_callback(event.src_path)
+            self.run_callback(event.src_path)
+
+    def on_moved(self, event):
+        """
+        Called when a file is renamed in the monitored directory.
+
+        A received file is renamed from its partial name only after its last
+        byte was written, so the callback runs right away without polling.
+
+        Args:
+            event (FileSystemEvent): The event object containing details about the file.
+        """
+        if not event.is_directory and not event.dest_path.endswith(PARTIAL_SUFFIX):
+            print(f"[+] File received: {event.dest_path}")
+            self.run_callback(event.dest_path)
+
+    def run_callback(self, file_path):
+        """
+        Call the decryption callback, logging its errors.
+
+        The handler runs on the observer's thread; an exception escaping it
+        would stop the observer and all further inbound processing.
+
+        Args:
+            file_path (str): Path of the new file.
+        """
+        try:
+            self.decryption_callback(file_path)
+        except Exception as e:
+            print(f"[-] Failed to process {file_path}: {e}")
 
     def wait_for_file_completion(self, file_path, timeout=10, check_interval=0.5):
         """
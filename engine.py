@@ -1,78 +1,1094 @@
 import os
 import steganographic as stegano
-from cryptographic import CryptographicFunctions
+from cryptographic import CryptographicFunctions, compress_payload
+from keystore import KeyStore
 import datetime
 import json
-import time
 import base64
+import struct
+import threading
+import queue
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
 
 
-class Engine:
+AEAD_TAG_SIZE = 16 # Poly1305 tag appended to every ciphertext
+
+# Header in front of every shard of a message split across several covers: message id, shard index, shard count.
+SHARD_HEADER_FORMAT = ">16sHH"
+SHARD_HEADER_SIZE = struct.calcsize(SHARD_HEADER_FORMAT)
+
+# Key material sent ahead of the stego image(s) of a message: "<message id>.key.json",
+# or a plain "key.json" from senders that do not tag messages
+KEY_FILE_NAME = "key.json"
+KEY_FILE_SUFFIX = ".key.json"
+IN_FLIGHT_TIMEOUT = 10 * 60 # seconds a message may wait for its key file or images
+
+# Send pipeline: jobs allowed to wait in front of each stage, and worker threads per stage.
+# Embedding and encoding spend most of their time in NumPy and OpenCV, which release the GIL.
+PIPELINE_QUEUE_SIZE = 4
+PIPELINE_WORKERS = {"encrypt": 1, "embed": os.cpu_count() or 1, "encode": os.cpu_count() or 1, "transmit": 1}
+
+# Plaintexts whose compression is kept, so sizing a message and encrypting it compress once
+COMPRESSION_CACHE_SIZE = 8
+
+COALESCE_WINDOW = 0.25 # seconds a message may wait for others to the same receiver
+
+# Single-artifact envelope embedded instead of the bare ciphertext: message id,
+# transmission key length, transmission key, nonce, then the ciphertext.
+ENVELOPE_HEADER_FORMAT = ">16sH"
+ENVELOPE_HEADER_SIZE = struct.calcsize(ENVELOPE_HEADER_FORMAT)
+NONCE_SIZE = 12
+
+
+def read_key_file(path:str):
+    """
+    Read the transmission key and tag from a key file.
+
+    Args:
+        path: path of the key file.
+
+    Returns:
+        (transmission_key, tag)
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        data = json.load(file)
+    return base64.b64decode(data["transmission_key"]), base64.b64decode(data["tag"])
+
+
+def key_file_name(message_id:bytes) -> str:
+    """
+    Name of the key file of a message.
+
+    Args:
+        message_id: 16-byte message id.
+    """
+    return f"{message_id.hex()}{KEY_FILE_SUFFIX}"
+
+
+def is_key_file(path:str) -> bool:
+    """
+    Whether a received file is a key file rather than a stego image.
+
+    Args:
+        path: path of the received file.
+    """
+    name = os.path.basename(path)
+    return name == KEY_FILE_NAME or name.endswith(KEY_FILE_SUFFIX)
+
+
+def message_id_of(path:str):
+    """
+    Message id a received file is tagged with.
+
+    Key files are named "<id>.key.json" and stego images "<id>_...".
+
+    Args:
+        path: path of the received file.
+
+    Returns:
+        The 16-byte message id, or None for untagged files.
+    """
+    prefix = os.path.basename(path).split("_", 1)[0].split(".", 1)[0]
+    try:
+        message_id = bytes.fromhex(prefix)
+    except ValueError:
+        return None
+    return message_id if len(message_id) == 16 else None
+
+
+def seal_envelope(encrypted, message_id:bytes) -> bytes:
+    """
+    Pack an encrypted message with its id and key material into one envelope.
+
+    Args:
+        encrypted: cryptographic.EncryptedMessage.
+        message_id: 16-byte message id.
+    """
+    return b"".join((
+        struct.pack(ENVELOPE_HEADER_FORMAT, message_id, len(encrypted.transmission_key)),
+        encrypted.transmission_key,
+        encrypted.tag,
+        encrypted.ciphertext,
+    ))
+
+
+def open_envelope(envelope:bytes):
+    """
+    Split an envelope from seal_envelope().
+
+    Args:
+        envelope: the extracted envelope.
+
+    Returns:
+        (message_id, transmission_key, tag, ciphertext)
+    """
+    message_id, key_size = struct.unpack_from(ENVELOPE_HEADER_FORMAT, envelope)
+    offset = ENVELOPE_HEADER_SIZE + key_size
+    if len(envelope) < offset + NONCE_SIZE:
+        raise ValueError("Envelope is truncated.")
+    return message_id, envelope[ENVELOPE_HEADER_SIZE:offset], envelope[offset:offset + NONCE_SIZE], envelope[offset + NONCE_SIZE:]
+
+
+def join_batch(messages:list) -> str:
+    """
+    Frame several messages into one plaintext record, as netstrings ("<length>:<message>,").
+
+    Args:
+        messages: the plaintext messages.
+    """
+    return "".join(f"{len(message)}:{message}," for message in messages)
+
+
+def split_batch(record:str) -> list:
+    """
+    Undo join_batch().
+
+    Args:
+        record: the decrypted record.
+
+    Raises:
+        ValueError: the record is not a sequence of netstrings.
+    """
+    messages = []
+    offset = 0
+    while offset < len(record):
+        separator = record.index(":", offset)
+        end = separator + 1 + int(record[offset:separator])
+        if record[end:end + 1] != ",":
+            raise ValueError("Malformed message batch.")
+        messages.append(record[separator + 1:end])
+        offset = end + 1
+    return messages
+
+
+class ShardAssembler:
+    """
+    Collects the shards of split messages and rebuilds each ciphertext once all its shards arrived.
+
+    A message whose shards stop arriving is dropped after the timeout, so a
+    lost shard does not keep the others in memory.
+    """
+
+    def __init__(self, timeout:float = IN_FLIGHT_TIMEOUT):
+        """
+        Args:
+            timeout: seconds after the last shard of an incomplete message before it is dropped.
+        """
+        self.timeout = timeout
+        self.pending = {} # message id -> {shard index: chunk}
+        self.updated = {} # message id -> time its last shard arrived
+        self.lock = threading.Lock()
+
+    def add(self, shard:bytes):
+        """
+        Store one extracted shard.
+
+        Args:
+            shard: shard header followed by its chunk of ciphertext.
+
+        Returns:
+            (message_id, ciphertext), with ciphertext None until every shard arrived.
+        """
+        message_id, index, count = struct.unpack_from(SHARD_HEADER_FORMAT, shard)
+        with self.lock:
+            self.expire()
+            chunks = self.pending.setdefault(message_id, {})
+            chunks[index] = shard[SHARD_HEADER_SIZE:]
+            self.updated[message_id] = time.monotonic()
+            if len(chunks) < count:
+                return message_id, None
+            del self.pending[message_id], self.updated[message_id]
+        return message_id, b"".join(chunks[i] for i in range(count))
+
+    def expire(self):
+        """
+        Drop incomplete messages that received no shard within the timeout. Call with the lock held.
+        """
+        now = time.monotonic()
+        for message_id, updated in list(self.updated.items()):
+            if now - updated > self.timeout:
+                print(f"[-] Message {message_id.hex()} timed out with {len(self.pending[message_id])} shard(s) received.")
+                del self.pending[message_id], self.updated[message_id]
+
+
+class InFlightMessage:
+    """
+    Receive state of one message: its key material and the images waiting for it.
+    """
 
     def __init__(self):
+        self.key = None # (transmission_key, tag) from the key file
+        self.waiting = [] # images that need the key file, completed before it
+        self.updated = time.monotonic()
+
+
+class ReceiveCoordinator:
+    """
+    Tracks inbound messages in a table keyed by message id, so any number of
+    messages from any number of senders are processed at once.
+
+    Every complete stego image goes to a worker thread right away. Images
+    carrying an envelope need nothing else. Otherwise the image is decrypted
+    with the key file of its message id; an image that completes before its
+    key file waits in the table until the key file arrives.
+
+    Untagged files from older senders share the None entry: an image belongs
+    to the last plain key.json received before it.
+    """
+
+    def __init__(self, process, max_workers:int = None, timeout:float = IN_FLIGHT_TIMEOUT):
+        """
+        Args:
+            process: called as process(image_path, transmission_key, tag) on a worker
+                thread, with None key material when no key file arrived yet; raises
+                FileNotFoundError when the image needs a key file, and returns None
+                while a sharded message is incomplete.
+            max_workers: number of worker threads, defaults to the executor's default.
+            timeout: seconds after which an unfinished message is dropped from the table.
+        """
+        self.process = process
+        self.timeout = timeout
+        self.in_flight = {} # message id -> InFlightMessage
+        self.lock = threading.Lock()
+        self.workers = ThreadPoolExecutor(max_workers, thread_name_prefix="receive")
+
+    def file_received(self, path:str):
+        """
+        Handle one complete file in the receive directory.
+
+        Args:
+            path: path of the key file or stego image.
+        """
+        message_id = message_id_of(path)
+        if is_key_file(path):
+            # Read at once, a plain key.json is replaced by the next message's
+            try:
+                key = read_key_file(path)
+            except Exception as e:
+                print(f"[-] Failed to read key file {path}: {e}")
+                return
+            with self.lock:
+                self.expire()
+                message = self.in_flight.setdefault(message_id, InFlightMessage())
+                message.key, message.updated = key, time.monotonic()
+                waiting, message.waiting = message.waiting, []
+            for image_path in waiting:
+                self.submit(image_path, message_id, key)
+            return
+
+        with self.lock:
+            message = self.in_flight.get(message_id)
+            key = message.key if message else None
+        self.submit(path, message_id, key)
+
+    def submit(self, image_path:str, message_id, key):
+        """
+        Queue the extraction and decryption of one image.
+
+        Args:
+            image_path: path of the stego image.
+            message_id: id the image is tagged with, or None.
+            key: (transmission_key, tag) of its message, or None.
+        """
+        self.workers.submit(self.run, image_path, message_id, key)
+
+    def run(self, image_path:str, message_id, key):
+        try:
+            plaintext = self.process(image_path, *(key or (None, None)))
+        except FileNotFoundError:
+            # No envelope and no key file yet, retry when it arrives
+            with self.lock:
+                message = self.in_flight.setdefault(message_id, InFlightMessage())
+                if message.key is None:
+                    message.waiting.append(image_path)
+                    return
+                key = message.key
+            self.submit(image_path, message_id, key)
+            return
+        except Exception as e:
+            print(f"[-] Failed to process {image_path}: {e}")
+            return
+
+        # A finished message leaves the table; the untagged entry keeps the last key file
+        if plaintext is not None and message_id is not None:
+            with self.lock:
+                self.in_flight.pop(message_id, None)
+
+    def expire(self):
+        """
+        Drop tagged messages that saw no progress within the timeout. Call with the lock held.
+        """
+        now = time.monotonic()
+        for message_id, message in list(self.in_flight.items()):
+            if message_id is not None and now - message.updated > self.timeout:
+                print(f"[-] Message {message_id.hex()} timed out with {len(message.waiting)} image(s) waiting.")
+                del self.in_flight[message_id]
+
+
+def resolve(future:Future, result=None, exception:Exception = None):
+    """
+    Set the outcome of a Future unless it is already done, e.g. cancelled by its caller.
+
+    Args:
+        future: the Future to resolve.
+        result: its result, when exception is None.
+        exception: its error.
+    """
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+class SendJob:
+    """
+    One message moving through a SendPipeline, with the results of every stage so far.
+    """
+
+    def __init__(self, payload_data:str, image_path:str, receiver_public_key, destination:str, receiver_algorithm:str = None, flags:int = 0):
+        self.payload_data = payload_data
+        self.image_path = image_path
+        self.receiver_public_key = receiver_public_key
+        self.receiver_algorithm = receiver_algorithm
+        self.destination = destination
+        self.flags = flags # extra stego header flags
+        self.future = Future() # resolves to the message id once transmitted
+        self.message_id = uuid.uuid4().bytes
+        self.capacity_map = None
+        self.encrypted = None
+        self.image = None # cover with the payload embedded
+        self.stego_image = None # encoded image
+
+
+class SendPipeline:
+    """
+    Staged send path: encrypt -> embed -> encode -> transmit.
+
+    Every stage has its own worker threads and a bounded queue in front of
+    it, so message N+1 is encrypted and embedded while message N is on the
+    wire and sustained throughput approaches that of the slowest stage. A
+    full queue blocks submit(), which bounds the images held in memory.
+
+    With several embed or encode workers, messages may reach the receiver out
+    of order; the receiver tracks every message on its own.
+    """
+
+    def __init__(self, engine, send_file, workers:dict = None, queue_size:int = PIPELINE_QUEUE_SIZE, encoder:str = "png", compression:int = None):
+        """
+        Args:
+            engine: the Engine whose keys, capacity maps and settings are used.
+            send_file: called as send_file(files, destination), e.g. Networking.send_file;
+                returns True once the files were delivered.
+            workers: worker threads per stage name, defaults to PIPELINE_WORKERS.
+            queue_size: jobs allowed to wait in front of each stage.
+            encoder: one of steganographic.ENCODERS.
+            compression: encoder compression setting, see steganographic.encode_image().
+        """
+        self.engine = engine
+        self.send_file = send_file
+        self.encoder = encoder
+        self.compression = compression
+
+        workers = dict(PIPELINE_WORKERS, **(workers or {}))
+        self.stages = [("encrypt", self.encrypt), ("embed", self.embed), ("encode", self.encode), ("transmit", self.transmit)]
+        self.queues = [queue.Queue(queue_size) for _ in self.stages]
+        self.threads = []
+        for index, (name, function) in enumerate(self.stages):
+            for _ in range(workers[name]):
+                thread = threading.Thread(target=self.worker, args=(index, function), name=f"send-{name}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, payload_data:str, image_path:str, receiver_public_key, destination:str, receiver_algorithm:str = None, flags:int = 0) -> Future:
+        """
+        Queue a message for sending, blocking while the first stage is full.
+
+        Args:
+            payload_data: the plaintext message.
+            image_path: path of the cover image.
+            receiver_public_key: public key of the receiver.
+            destination: address of the receiver.
+            receiver_algorithm: KEM algorithm of the receiver's key, as published in the registry.
+            flags: extra steganographic FLAG_* bits describing the payload.
+
+        Returns:
+            A Future resolving to the message id once transmitted, or to the error of the failed stage.
+            Cancelling it before the message is encrypted drops the message.
+        """
+        job = SendJob(payload_data, image_path, receiver_public_key, destination, receiver_algorithm, flags)
+        self.queues[0].put(job)
+        return job.future
+
+    def close(self):
+        """
+        Finish the queued messages, then stop every worker.
+        """
+        for index, (name, _) in enumerate(self.stages):
+            stage_threads = [thread for thread in self.threads if thread.name == f"send-{name}"]
+            for _ in stage_threads:
+                self.queues[index].put(None)
+            for thread in stage_threads:
+                thread.join()
+
+    def worker(self, index:int, function):
+        while True:
+            job = self.queues[index].get()
+            if job is None:
+                return
+            # A message cancelled by its caller is dropped before it is encrypted;
+            # once running its Future can no longer be cancelled or resolved twice
+            if index == 0 and not job.future.set_running_or_notify_cancel():
+                continue
+            if job.future.done():
+                continue
+            try:
+                function(job)
+            except Exception as e:
+                resolve(job.future, exception=e)
+                continue
+            if index + 1 < len(self.queues):
+                self.queues[index + 1].put(job)
+            else:
+                resolve(job.future, job.message_id)
+
+    def encrypt(self, job:SendJob):
+        job.capacity_map, job.encrypted = self.engine.encrypt_payload(job.payload_data, job.image_path, job.receiver_public_key, job.receiver_algorithm)
+
+    def embed(self, job:SendJob):
+        job.image = stegano.load_cover(job.image_path)
+        stegano.embed_image(job.image, self.engine.carrier_payload(job.encrypted, job.message_id), job.capacity_map, self.engine.payload_flags(job.encrypted) | job.flags)
+
+    def encode(self, job:SendJob):
+        job.stego_image = stegano.encode_image(job.image, self.encoder, self.compression)
+        job.image = None
+
+    def transmit(self, job:SendJob):
+        files = self.engine.transmission_files(job.message_id, job.stego_image, job.encrypted.transmission_key, job.encrypted.tag, self.encoder)
+        if not self.send_file(files, job.destination):
+            raise ConnectionError(f"Failed to send message {job.message_id.hex()} to {job.destination}.")
+        job.stego_image = None
+
+
+class PendingBatch:
+    """
+    Messages to one receiver waiting in a MessageCoalescer, sent in the cover of the first one.
+    """
+
+    def __init__(self, image_path:str, receiver_public_key, destination:str, receiver_algorithm:str, timer:threading.Timer):
+        self.image_path = image_path
+        self.receiver_public_key = receiver_public_key
+        self.destination = destination
+        self.receiver_algorithm = receiver_algorithm
+        self.timer = timer # flushes the batch when the window ends
+        self.messages = []
+        self.futures = [] # one per message, resolved when the batch is transmitted
+
+
+class MessageCoalescer:
+    """
+    Optional front end of a SendPipeline that coalesces bursts of messages.
+
+    Messages for the same receiver arriving within the window are framed into
+    one record and sent as one encrypted message in one stego image: one
+    session lookup, one Sobel pass, one encode and one transfer instead of one
+    per message. The first message of a group waits at most the window; a
+    group is sent early when the next message would no longer fit its cover.
+    A group of one is sent as a plain message.
+    """
+
+    def __init__(self, pipeline:SendPipeline, window:float = COALESCE_WINDOW):
+        """
+        Args:
+            pipeline: the SendPipeline the coalesced records are submitted to.
+            window: latency budget in seconds.
+        """
+        self.pipeline = pipeline
+        self.engine = pipeline.engine
+        self.window = window
+        self.pending = {} # (destination, receiver public key) -> PendingBatch
+        self.lock = threading.Lock()
+
+    def submit(self, payload_data:str, image_path:str, receiver_public_key, destination:str, receiver_algorithm:str = None) -> Future:
+        """
+        Queue a message, see SendPipeline.submit().
+
+        Args:
+            payload_data: the plaintext message.
+            image_path: path of the cover image; a group is sent in the cover of its first message.
+            receiver_public_key: public key of the receiver.
+            destination: address of the receiver.
+            receiver_algorithm: KEM algorithm of the receiver's key, as published in the registry.
+
+        Returns:
+            A Future resolving to the id of the message that carried this one once transmitted.
+        """
+        key = (destination, receiver_public_key)
+        future = Future()
+        full = None
+        with self.lock:
+            group = self.pending.get(key)
+            if group is not None and not self.fits(group, payload_data):
+                full = self.pending.pop(key)
+                full.timer.cancel()
+                group = None
+            if group is None:
+                group = PendingBatch(image_path, receiver_public_key, destination, receiver_algorithm, threading.Timer(self.window, self.flush, args=(key,)))
+                group.timer.daemon = True
+                self.pending[key] = group
+                group.timer.start()
+            group.messages.append(payload_data)
+            group.futures.append(future)
+
+        if full is not None:
+            self.send(full)
+        return future
+
+    def fits(self, group:PendingBatch, payload_data:str) -> bool:
+        """
+        Whether a group still fits its cover with one more message.
+        """
+        record = join_batch(group.messages + [payload_data])
+        capacity_map = self.engine.cover_capacity(group.image_path)
+        # Compression only shrinks the record, so the uncompressed size settles most checks cheaply
+        if capacity_map.fits(self.engine.ciphertext_size(record, group.receiver_algorithm, compress=False)):
+            return True
+        return capacity_map.fits(self.engine.ciphertext_size(record, group.receiver_algorithm))
+
+    def flush(self, key=None):
+        """
+        Send the pending group of one receiver now, or of every receiver.
+
+        Args:
+            key: (destination, receiver public key), or None for all groups.
+        """
+        with self.lock:
+            keys = list(self.pending) if key is None else [key]
+            groups = [self.pending.pop(pending_key) for pending_key in keys if pending_key in self.pending]
+        for group in groups:
+            group.timer.cancel()
+            self.send(group)
+
+    def send(self, group:PendingBatch):
+        """
+        Submit a group to the pipeline and resolve the futures of its messages with the result.
+        """
+        messages, futures = group.messages, group.futures
+        if len(messages) == 1:
+            payload_data, flags = messages[0], 0
+        else:
+            payload_data, flags = join_batch(messages), stegano.FLAG_BATCH
+
+        try:
+            sent = self.pipeline.submit(payload_data, group.image_path, group.receiver_public_key,
+                                        group.destination, group.receiver_algorithm, flags)
+        except Exception as e:
+            sent = Future()
+            sent.set_exception(e)
+
+        def done(sent):
+            for future in futures:
+                if sent.exception() is not None:
+                    resolve(future, exception=sent.exception())
+                else:
+                    resolve(future, sent.result())
+        sent.add_done_callback(done)
+
+
+class Engine:
+
+    def __init__(self, username:str = None, passphrase:str = None, algorithm:str = None):
     
         # DS
-        self.crypto = CryptographicFunctions()
-        self.crypto.generate_key_pairs()
-        self.key_received = None # recieved transmission key
-        self.received_tag = None # tag from the reciever
+        self.crypto = CryptographicFunctions(algorithm) # KEM parameter set, defaults to cryptographic.KEM_ALGORITHM
+        self.load_key_pairs(username, passphrase)
         self.public_key_received = None # public key of reciever
         self.output_path = None
         self.transmission_key = None # key to send to receiver
         self.transmission_tag = None # tag to send to receiver
+        self.capacity_maps = {} # cover path -> (modification time, capacity map)
+        self.shards = ShardAssembler() # shards of split messages received so far
+        self.compress = True # compress payloads before encryption when it makes them smaller
+        self.compressed_payloads = OrderedDict() # plaintext -> compress_payload() result, most recent last
+        self.compression_lock = threading.Lock()
+        self.envelope = True # embed the transmission key and nonce with the ciphertext, no key file needed
+        self.received_messages = queue.Queue() # decrypted inbound messages, in arrival order
+        self.receiver = ReceiveCoordinator(self.extract_data) # pairs received key files and images
+
+
+    def load_key_pairs(self, username:str, passphrase:str) -> bool:
+        """
+        Load the user's key pair from the local keystore, generating and storing
+        a new one when there is none or it is due for rotation.
+
+        Without a username and passphrase a fresh key pair is generated and not stored.
+
+        Args:
+            username: the logged in user.
+            passphrase: the user's passphrase, protects the stored secret key.
+
+        Returns:
+            True if a new key pair was generated.
+        """
+        if not username or not passphrase:
+            self.crypto.generate_key_pairs()
+            return True
+
+        keystore = KeyStore(username)
+        algorithm = self.crypto.algorithm
+        key_pair = keystore.load(passphrase, algorithm)
+        if key_pair is not None:
+            self.crypto.load_key_pairs(*key_pair)
+            return False
+
+        self.crypto.generate_key_pairs()
+        keystore.save(passphrase, algorithm, self.crypto.publickey, self.crypto.privatekey)
+        print("[+] New key pair generated and stored.")
+        return True
+
+
+    def cover_capacity(self, image_path:str) -> stegano.CapacityMap:
+        """
+        Return the capacity map of a cover image, computed once per file version.
+
+        Args:
+            image_path: path of the cover image.
+        """
+        modified = os.path.getmtime(image_path)
+        cached = self.capacity_maps.get(image_path)
+        if cached is None or cached[0] != modified:
+            cached = (modified, stegano.capacity(image_path))
+            self.capacity_maps[image_path] = cached
+        return cached[1]
+
+
+    def compressed_payload(self, plaintext:bytes):
+        """
+        Compress a plaintext once for both sizing and encryption.
+
+        The last few results are kept, so a message checked against its cover
+        before it is sent is not compressed again when it is encrypted.
+
+        Args:
+            plaintext: the message bytes.
+
+        Returns:
+            compress_payload() of the plaintext, or None when compression is off or does not help.
+        """
+        if not self.compress:
+            return None
+        with self.compression_lock:
+            if plaintext in self.compressed_payloads:
+                self.compressed_payloads.move_to_end(plaintext)
+                return self.compressed_payloads[plaintext]
+
+        compressed = compress_payload(plaintext)
+        with self.compression_lock:
+            self.compressed_payloads[plaintext] = compressed
+            while len(self.compressed_payloads) > COMPRESSION_CACHE_SIZE:
+                self.compressed_payloads.popitem(last=False)
+        return compressed
+
+
+    def ciphertext_size(self, payload_data:str, receiver_algorithm:str = None, compress:bool = None) -> int:
+        """
+        Size in bytes of what will be embedded for a message: the ciphertext
+        encrypt_payload() produces, in its envelope when enabled.
+
+        Args:
+            payload_data: the plaintext message.
+            receiver_algorithm: KEM algorithm of the receiver's key, sizes the envelope;
+                defaults to our own.
+            compress: False to leave compression out, a cheap upper bound;
+                by default the payload is sized as compressed_payload() leaves it.
+        """
+        plaintext = payload_data.encode()
+        compressed = self.compressed_payload(plaintext) if compress is not False else None
+        size = len(compressed if compressed is not None else plaintext) + AEAD_TAG_SIZE
+        if self.envelope:
+            size += ENVELOPE_HEADER_SIZE + self.crypto.transmission_key_size(receiver_algorithm) + NONCE_SIZE
+        return size
+
+
+    def check_capacity(self, payload_data:str, image_path:str, receiver_algorithm:str = None) -> stegano.CapacityMap:
+        """
+        Reject a message that cannot fit in the cover before any encryption or networking.
+
+        Args:
+            payload_data: the plaintext message.
+            image_path: path of the cover image.
+            receiver_algorithm: KEM algorithm of the receiver's key, defaults to our own.
+        """
+        capacity_map = self.cover_capacity(image_path)
+        size = self.ciphertext_size(payload_data, receiver_algorithm)
+        if not capacity_map.fits(size):
+            overhead = size - len(payload_data.encode())
+            raise ValueError(f"Message too large for the selected image (capacity about {capacity_map.payload_bytes - overhead} bytes).")
+        return capacity_map
+
+
+    def choose_cover(self, payload_data:str, cover_library) -> str:
+        """
+        Pick the smallest cover in a library that fits the encrypted message.
+
+        Args:
+            payload_data: the plaintext message.
+            cover_library: a cover_library.CoverLibrary.
+        """
+        cover = cover_library.best_fit(self.ciphertext_size(payload_data))
+        if cover is None:
+            raise ValueError("No cover in the library is large enough for this message.")
+        return cover
+
+
+    def choose_shard_covers(self, payload_data:str, cover_library) -> list:
+        """
+        Pick covers from a library to split a message too large for any single one,
+        largest first so the fewest images are sent.
+
+        Args:
+            payload_data: the plaintext message.
+            cover_library: a cover_library.CoverLibrary.
+        """
+        size = self.ciphertext_size(payload_data)
+        covers = []
+        for path, width, height, payload_bytes in reversed(cover_library.covers()):
+            if payload_bytes <= SHARD_HEADER_SIZE:
+                break
+            covers.append(path)
+            size -= payload_bytes - SHARD_HEADER_SIZE
+            if size <= 0:
+                return covers
+        raise ValueError("The covers in the library cannot hold this message together.")
+
+
+    def payload_flags(self, encrypted) -> int:
+        """
+        Stego header flags describing an encrypted payload.
 
+        Args:
+            encrypted: cryptographic.EncryptedMessage.
+        """
+        flags = stegano.FLAG_COMPRESSED if encrypted.compressed else 0
+        if self.envelope:
+            flags |= stegano.FLAG_ENVELOPE
+        return flags
 
-    def hide_data(self, payload_data:str, image_path:str, receiver_public_key) -> str:
-        self.crypto.key_generation(receiver_public_key)
 
-        # print(self.crypto.privatekey)
+    def carrier_payload(self, encrypted, message_id:bytes) -> bytes:
+        """
+        Bytes to embed for an encrypted message: its envelope, or the bare
+        ciphertext when the key material travels in a key file.
 
+        Args:
+            encrypted: cryptographic.EncryptedMessage.
+            message_id: 16-byte message id.
+        """
+        return seal_envelope(encrypted, message_id) if self.envelope else encrypted.ciphertext
+
+
+    def stego_file_name(self, encoder:str = "png", message_id:bytes = None, shard_index:int = None) -> str:
+        """
+        Timestamped file name for a new stego image.
+
+        Args:
+            encoder: one of steganographic.ENCODERS, selects the extension.
+            message_id: 16-byte message id the receiver correlates the image with.
+            shard_index: index of the shard, for messages split across several images.
+        """
+        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        prefix = f"{message_id.hex()}_" if message_id else ""
+        if shard_index is not None:
+            prefix += f"{shard_index}_"
+        return f"{prefix}{timestamp}_stegano_image{stegano.ENCODERS[encoder]}"
+
+
+    def transmission_files(self, message_id:bytes, stego_image, transmission_key:bytes, tag:bytes, encoder:str = "png") -> list:
+        """
+        Files to send for one message, as (file_name, data) tuples for Networking.send_file().
+
+        The stego image alone when it carries an envelope, otherwise the key
+        file first and then the image.
+
+        Args:
+            message_id: 16-byte message id.
+            stego_image: the encoded stego image.
+            transmission_key: transmission key of the message.
+            tag: nonce of the message.
+            encoder: one of steganographic.ENCODERS the image was encoded with.
+        """
+        files = [(self.stego_file_name(encoder, message_id), stego_image)]
+        if not self.envelope:
+            files.insert(0, self.key_file(message_id, transmission_key, tag))
+        return files
+
+
+    def shard_transmission_files(self, message_id:bytes, output_paths:list, transmission_key:bytes, tag:bytes) -> list:
+        """
+        Files to send for a message split by hide_data_sharded(), for Networking.send_file().
+
+        The shard images in order, after the key file unless the envelope is enabled.
+
+        Args:
+            message_id: 16-byte message id.
+            output_paths: paths of the shard images.
+            transmission_key: transmission key of the message.
+            tag: nonce of the message.
+        """
+        files = list(output_paths)
+        if not self.envelope:
+            files.insert(0, self.key_file(message_id, transmission_key, tag))
+        return files
+
+
+    def key_file(self, message_id:bytes, transmission_key:bytes, tag:bytes):
+        """
+        Key file of a message sent without an envelope, as a (file_name, data) tuple.
+
+        Args:
+            message_id: 16-byte message id.
+            transmission_key: transmission key of the message.
+            tag: nonce of the message.
+        """
+        key_data = {
+            "message_id": message_id.hex(),
+            "transmission_key": base64.b64encode(transmission_key).decode("utf-8"),
+            "tag": base64.b64encode(tag).decode("utf-8")
+        }
+        return key_file_name(message_id), json.dumps(key_data, indent=4).encode("utf-8")
+
+
+    def encrypt_payload(self, payload_data:str, image_path:str, receiver_public_key, receiver_algorithm:str = None):
+        """
+        Check the cover capacity, then encrypt the payload for the receiver.
+
+        Args:
+            payload_data: the plaintext message.
+            image_path: path of the cover image.
+            receiver_public_key: public key of the receiver.
+            receiver_algorithm: KEM algorithm of the receiver's key, as published in the registry.
+
+        Returns:
+            (capacity_map, encrypted): the capacity map of the cover, for reuse
+            by the embed, and the cryptographic.EncryptedMessage.
+        """
+        capacity_map = self.check_capacity(payload_data, image_path, receiver_algorithm)
+        compressed = self.compressed_payload(payload_data.encode())
+        return capacity_map, self.crypto.encrypt(payload_data, receiver_public_key, compressed is not None, receiver_algorithm, compressed)
+
+
+    def hide_data(self, payload_data:str, image_path:str, receiver_public_key, encoder:str = "png", compression:int = None, receiver_algorithm:str = None) -> str:
         #1. Encrypt the data
-        self.crypto.key_generation(receiver_public_key)
-        self.crypto.payload = payload_data
-        self.crypto.encrypt_msg()
+        capacity_map, encrypted = self.encrypt_payload(payload_data, image_path, receiver_public_key, receiver_algorithm)
+        message_id = uuid.uuid4().bytes
 
         #2. Embed the encrypted data.
-        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
         base_dir="stegnographic_images"
         if not os.path.exists(base_dir):
             os.makedirs(base_dir)
         # Append the timestamp to the file name
-        timestamped_file_name = f"{timestamp}_stegano_image.png"
-        stegano.embed_data_adaptive(image_path, self.crypto.ciphertext, timestamped_file_name)
+        timestamped_file_name = self.stego_file_name(encoder, message_id)
+        stegano.embed_data_adaptive(image_path, self.carrier_payload(encrypted, message_id), timestamped_file_name, capacity_map, compression, self.payload_flags(encrypted))
 
 
-        print(f"ciphertext: {self.crypto.ciphertext}, tag: {self.crypto.tag}, transmission_key: {self.crypto.transmission_key}")
-        return timestamped_file_name, self.crypto.transmission_key, self.crypto.tag
+        print(f"ciphertext: {encrypted.ciphertext}, tag: {encrypted.tag}, transmission_key: {encrypted.transmission_key}")
+        return timestamped_file_name, encrypted.transmission_key, encrypted.tag
 
 
-    def extract_data(self, stego_image_path:str) -> str:
+    def hide_data_to_bytes(self, payload_data:str, image_path:str, receiver_public_key, encoder:str = "png", compression:int = None, receiver_algorithm:str = None):
+        """
+        Encrypt and embed a message, keeping the stego image in memory.
 
-        time.sleep(40) # adjustments needed
-        data = {}
-        with open("received_files/key.json", "r", encoding="utf-8") as file:
-            data = json.load(file)  
+        Args:
+            payload_data: the plaintext message.
+            image_path: path of the cover image.
+            receiver_public_key: public key of the receiver.
+            encoder: one of steganographic.ENCODERS.
+            compression: encoder compression setting, see steganographic.encode_image().
+            receiver_algorithm: KEM algorithm of the receiver's key, as published in the registry.
 
-        transmission_key = base64.b64decode(data["transmission_key"])
-        tag = base64.b64decode(data["tag"])
+        Returns:
+            (message_id, stego_image, transmission_key, tag) with the encoded image as a
+            memoryview; name the image and key file after message_id when sending.
+        """
+        capacity_map, encrypted = self.encrypt_payload(payload_data, image_path, receiver_public_key, receiver_algorithm)
+        message_id = uuid.uuid4().bytes
+        stego_image = stegano.embed_to_bytes(image_path, self.carrier_payload(encrypted, message_id), capacity_map, encoder, compression, self.payload_flags(encrypted))
+        return message_id, stego_image, encrypted.transmission_key, encrypted.tag
 
-        self.key_received, self.received_tag = transmission_key, tag
 
-        #1. Decode the image for encrpyted data.
-        time.sleep(5)
-        self.crypto.ciphertext = stegano.extract_data_adaptive(stego_image_path)
+    def hide_data_batch(self, messages:list, max_workers:int = None, encoder:str = "png", compression:int = None):
+        """
+        Encrypt many messages, then embed them in parallel on a process pool.
 
-        print(f"ciphertext: {self.crypto.ciphertext}, tag: {self.received_tag}, transmission_key: {self.key_received}")
+        Args:
+            messages: list of (payload_data, image_path, receiver_public_key) tuples,
+                optionally with the receiver's KEM algorithm as a fourth item.
+            max_workers: number of embedding processes, defaults to the CPU count.
+            encoder: one of steganographic.ENCODERS.
+            compression: encoder compression setting, see steganographic.encode_image().
 
-        #2. Decrypt the extracted data.
-        self.crypto.plaintext = self.crypto.decryption_message(self.crypto.ciphertext, self.key_received, self.received_tag)
-        print(self.crypto.plaintext)
+        Yields:
+            (message index, output path, transmission_key, tag, error) as embeds complete,
+            with error None on success.
+        """
+        base_dir="stegnographic_images"
+        os.makedirs(base_dir, exist_ok=True)
+
+        jobs, indices, keys = [], [], {}
+        for index, (payload_data, image_path, receiver_public_key, *receiver_algorithm) in enumerate(messages):
+            try:
+                _, encrypted = self.encrypt_payload(payload_data, image_path, receiver_public_key, *receiver_algorithm)
+            except ValueError as e:
+                yield index, None, None, None, e
+                continue
+
+            # The message id keeps file names unique within the same second
+            message_id = uuid.uuid4().bytes
+            output_path = os.path.join(base_dir, self.stego_file_name(encoder, message_id))
+            jobs.append((self.carrier_payload(encrypted, message_id), image_path, output_path, self.payload_flags(encrypted)))
+            indices.append(index)
+            keys[index] = (encrypted.transmission_key, encrypted.tag)
+
+        for job_index, output_path, error in stegano.embed_batch(jobs, max_workers, compression):
+            index = indices[job_index]
+            transmission_key, tag = keys[index]
+            yield index, output_path, transmission_key, tag, error
+
+
+    def hide_data_sharded(self, payload_data:str, image_paths:list, receiver_public_key, max_workers:int = None, encoder:str = "png", compression:int = None, receiver_algorithm:str = None):
+        """
+        Encrypt a message once and split the ciphertext across several covers.
+
+        Covers are filled in order and only as many as needed are used. Every
+        shard carries the message id, its index and the shard count, and the
+        shards are embedded in parallel. Send the returned images as one set,
+        after the key file unless the envelope is enabled; the receiver
+        decrypts once the last shard arrives.
+
+        Args:
+            payload_data: the plaintext message.
+            image_paths: paths of the cover images.
+            receiver_public_key: public key of the receiver.
+            max_workers: number of embedding processes, defaults to the CPU count.
+            encoder: one of steganographic.ENCODERS.
+            compression: encoder compression setting, see steganographic.encode_image().
+            receiver_algorithm: KEM algorithm of the receiver's key, as published in the registry.
+
+        Returns:
+            (message_id, output_paths, transmission_key, tag) with the paths in shard order;
+            the caller removes the shard images once they are sent.
+        """
+        chunk_sizes = [self.cover_capacity(image_path).payload_bytes - SHARD_HEADER_SIZE for image_path in image_paths]
+        if self.ciphertext_size(payload_data, receiver_algorithm) > sum(size for size in chunk_sizes if size > 0):
+            raise ValueError("Message too large for the selected images.")
+
+        compressed = self.compressed_payload(payload_data.encode())
+        encrypted = self.crypto.encrypt(payload_data, receiver_public_key, compressed is not None, receiver_algorithm, compressed)
+        message_id = uuid.uuid4().bytes
+        ciphertext = self.carrier_payload(encrypted, message_id)
 
+        # Fill the covers in order
+        shards = []
+        offset = 0
+        for image_path, chunk_size in zip(image_paths, chunk_sizes):
+            if offset >= len(ciphertext):
+                break
+            if chunk_size > 0:
+                shards.append((ciphertext[offset:offset + chunk_size], image_path))
+                offset += chunk_size
+
+        base_dir="stegnographic_images"
+        os.makedirs(base_dir, exist_ok=True)
+        jobs = []
+        for index, (chunk, image_path) in enumerate(shards):
+            shard = struct.pack(SHARD_HEADER_FORMAT, message_id, index, len(shards)) + chunk
+            output_path = os.path.join(base_dir, self.stego_file_name(encoder, message_id, index))
+            jobs.append((shard, image_path, output_path))
+
+        output_paths = [None] * len(jobs)
+        results = stegano.embed_batch(jobs, max_workers, compression, stegano.FLAG_SHARD | self.payload_flags(encrypted))
+        try:
+            for index, output_path, error in results:
+                if error:
+                    raise error
+                output_paths[index] = output_path
+        except Exception:
+            # An incomplete set is useless: wait for the shards still being written, then remove them all
+            results.close()
+            for _, _, output_path in jobs:
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+            raise
+        return message_id, output_paths, encrypted.transmission_key, encrypted.tag
 
 
+    def file_received(self, path:str):
+        """
+        Callback for every complete file in the receive directory.
 
+        Args:
+            path: path of the key file or stego image.
+        """
+        self.receiver.file_received(path)
 
 
+    def extract_data(self, stego_image_path:str, transmission_key:bytes = None, tag:bytes = None) -> str:
+        """
+        Extract and decrypt the message in a stego image.
+
+        Args:
+            stego_image_path: path of the received stego image.
+            transmission_key: transmission key of the message, ignored when the image
+                carries an envelope; otherwise read with the tag from the key file
+                next to the image when not given.
+            tag: nonce of the message.
+
+        Returns:
+            The message, or the list of messages when the image carries a batch.
+        """
+        #1. Decode the image for encrpyted data.
+        ciphertext, flags = stegano.extract_data_adaptive(stego_image_path, with_flags=True)
 
+        # Without an envelope the key file is needed first: a shard that completes its
+        # message is consumed, so it must not be stored before a retry is ruled out
+        if not flags & stegano.FLAG_ENVELOPE and transmission_key is None:
+            message_id = message_id_of(stego_image_path)
+            key_file = key_file_name(message_id) if message_id else KEY_FILE_NAME
+            transmission_key, tag = read_key_file(os.path.join(os.path.dirname(stego_image_path), key_file))
+
+        # A shard only completes its message once every other shard arrived
+        if flags & stegano.FLAG_SHARD:
+            message_id, ciphertext = self.shards.add(ciphertext)
+            if ciphertext is None:
+                print(f"[+] Shard of message {message_id.hex()} received, waiting for the rest.")
+                return
+
+        if flags & stegano.FLAG_ENVELOPE:
+            message_id, transmission_key, tag, ciphertext = open_envelope(ciphertext)
+            print(f"[+] Message {message_id.hex()} extracted.")
+
+        print(f"ciphertext: {ciphertext}, tag: {tag}, transmission_key: {transmission_key}")
+
+        #2. Decrypt the extracted data.
+        plaintext = self.crypto.decryption_message(ciphertext, transmission_key, tag, bool(flags & stegano.FLAG_COMPRESSED))
 
+        # A batch from a MessageCoalescer holds several messages, delivered in the order they were sent
+        if flags & stegano.FLAG_BATCH:
+            try:
+                messages = split_batch(plaintext)
+            except ValueError:
+                messages = [plaintext]
+            for message in messages:
+                self.received_messages.put(message)
+                print(message)
+            return messages
 
+        self.received_messages.put(plaintext)
+        print(plaintext)
+        return plaintext
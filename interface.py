@@ -4,22 +4,22 @@ from tkinter import filedialog, messagebox
 from PIL import Image, ImageTk, ImageFont, ImageDraw
 import subprocess
 import sys
-import json
 import vpn_networking
 from networking import Networking
-from engine import Engine
+from engine import Engine, SendPipeline
 from directory_mointor import DirectoryMonitor
+from cover_library import CoverLibrary
 import threading
 import base64
 import queue
-import time
 
 
 file_path = None
+COVER_DIR = "covers" # covers picked automatically when no image is selected
 
 class StealthCodeApp:
 
-    def __init__(self, username, receiver_username, ip_address):
+    def __init__(self, username, receiver_username, ip_address, password=None):
         self.username = username
         self.receiver_username = receiver_username
         self.ip_address = ip_address
@@ -27,15 +27,22 @@ class StealthCodeApp:
         self.file_path = file_path
 
         # Initialize core components
-        self.stealthCodeEngine = Engine()
+        self.stealthCodeEngine = Engine(username, password)
         self.networking = Networking()
+        self.send_pipeline = SendPipeline(self.stealthCodeEngine, self.networking.send_file)
 
         # Directory monitoring
         self.monitored_dir = "received_files"
         os.makedirs(self.monitored_dir, exist_ok=True)
-        self.dir_monitor = DirectoryMonitor(self.monitored_dir, self.stealthCodeEngine.extract_data)
+        self.dir_monitor = DirectoryMonitor(self.monitored_dir, self.stealthCodeEngine.file_received)
         self.dir_monitor.start()
 
+        # Cover library, indexed in the background
+        self.cover_library = None
+        if os.path.isdir(COVER_DIR):
+            self.cover_library = CoverLibrary(COVER_DIR)
+            threading.Thread(target=self.cover_library.refresh, daemon=True).start()
+
         # Initialize Tkinter root window
         self.root = Tk()
         self.root.title("StealthCode")
@@ -47,15 +54,15 @@ class StealthCodeApp:
 
         # Submit the public key to the database
         jsonPublicKeyFormat = base64.b64encode(self.stealthCodeEngine.crypto.publickey).decode("utf-8")  # Convert bytes to Base64 string
-        self.update_key_thread(jsonPublicKeyFormat, self.username)
+        self.update_key_thread(jsonPublicKeyFormat, self.username, self.stealthCodeEngine.crypto.algorithm)
 
         # Start the received message update thread
         self.message_queue = queue.Queue()  # Thread-safe queue for messages
         self.update_received_message_tbox()
 
-    def update_key_thread(self, public_key, username):
-        """Submit the public key to the database in a separate thread."""
-        thread = threading.Thread(target=vpn_networking.send_public_key, args=(public_key, username))
+    def update_key_thread(self, public_key, username, algorithm):
+        """Submit the public key and its KEM algorithm to the database in a separate thread."""
+        thread = threading.Thread(target=vpn_networking.send_public_key, args=(public_key, username, algorithm))
         thread.daemon = True  # Ensures the thread exits when the main program closes
         thread.start()
         thread.join()
@@ -75,10 +82,7 @@ class StealthCodeApp:
     def _update_received_message(self):
         """Background thread to check for new messages and update the queue."""
         while True:
-            if self.stealthCodeEngine.crypto.plaintext:
-                self.message_queue.put(self.stealthCodeEngine.crypto.plaintext)
-                self.stealthCodeEngine.crypto.plaintext = None  # Clear the message
-            time.sleep(1)  # Avoid busy waiting
+            self.message_queue.put(self.stealthCodeEngine.received_messages.get())  # Blocks until a message is decrypted
 
     def _check_message_queue(self):
         """Check the message queue and update the GUI."""
@@ -110,35 +114,56 @@ class StealthCodeApp:
                 return
 
             global file_path
-            if not file_path:
+            cover_path = file_path
+            shard_covers = None # covers a message too large for any single one is split across
+            if not cover_path and self.cover_library:
+                try:
+                    cover_path = self.stealthCodeEngine.choose_cover(message, self.cover_library)
+                except ValueError:
+                    try:
+                        shard_covers = self.stealthCodeEngine.choose_shard_covers(message, self.cover_library)
+                    except ValueError as e:
+                        messagebox.showwarning("Image Too Small", str(e))
+                        return
+            if not cover_path and not shard_covers:
                 messagebox.showwarning("No Image", "Please select an image before sending!")
                 return
 
+            if cover_path:
+                try:
+                    self.stealthCodeEngine.check_capacity(message, cover_path)
+                except ValueError as e:
+                    messagebox.showwarning("Image Too Small", str(e))
+                    return
+
             vpn_networking.vpn_server_disconnection()
-            receiver_public_key = vpn_networking.get_public_key(self.receiver_username)
-            if not receiver_public_key:
+            receiver_key = vpn_networking.get_public_key(self.receiver_username, with_algorithm=True)
+            if not receiver_key:
                 messagebox.showerror("Error", "Failed to retrieve receiver's public key.")
                 return
+            receiver_public_key, receiver_algorithm = receiver_key
             vpn_networking.vpn_server_connection()
 
-            output_path, crypto_transmission_key, crypto_tag = self.stealthCodeEngine.hide_data(
-                message, file_path, receiver_public_key
-            )
-
-            key_data = {
-                "transmission_key": base64.b64encode(crypto_transmission_key).decode("utf-8"),
-                "tag": base64.b64encode(crypto_tag).decode("utf-8")
-            }
-
-            key_file_path = "/tmp/key.json"
-            with open(key_file_path, "w") as json_file:
-                json.dump(key_data, json_file, indent=4)
-
-            print(key_file_path)
-            print(output_path)
-            self.networking.send_file([key_file_path, output_path], self.ip_address)
+            if shard_covers:
+                # Sent as a set of stego images, the receiver decrypts once the last one arrives
+                message_id, output_paths, transmission_key, tag = self.stealthCodeEngine.hide_data_sharded(
+                    message, shard_covers, receiver_public_key, receiver_algorithm=receiver_algorithm)
+                try:
+                    files = self.stealthCodeEngine.shard_transmission_files(message_id, output_paths, transmission_key, tag)
+                    if not self.networking.send_file(files, self.ip_address):
+                        raise ConnectionError(f"Failed to send message {message_id.hex()} to {self.ip_address}.")
+                finally:
+                    # Shard images are only needed until they are on the wire
+                    for output_path in output_paths:
+                        os.remove(output_path)
+                self.message_box.clear_message()
+            else:
+                # Encrypted, embedded, encoded and sent from memory by the pipeline stages,
+                # overlapping with earlier messages still in flight
+                sent = self.send_pipeline.submit(message, cover_path, receiver_public_key, self.ip_address, receiver_algorithm)
+                self.message_box.clear_message()
+                sent.result()
 
-            self.message_box.clear_message()
             custom_message_dialog(self.root, "Message", f"Message Sent:\n\n{message}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to send message: {e}")
@@ -154,7 +179,7 @@ class StealthCodeApp:
         self.received_box = RoundedTextBox(self.root, 50, 430, 500, 150, 20, "#2b2b2b", "#3c3f41", "#ffffff", ("Krona One", 12))
 
         # Image placeholder
-        self.image_placeholder = ImagePlaceholder(self.root, 600, 140, 450, 450, "#3c3f41")
+        self.image_placeholder = ImagePlaceholder(self.root, 600, 140, 450, 450, "#3c3f41", self.stealthCodeEngine.cover_capacity)
 
         # Labels
         Label(self.root, text=f"Message to user: {self.receiver_username}", bg="#2b2b2b", fg="#ffffff", font=("Krona One", 14)).place(x=55, y=140)
@@ -243,7 +268,7 @@ class RoundedTextBox:
 
 
 class ImagePlaceholder:
-    def __init__(self, master, x, y, width, height, bg_color):
+    def __init__(self, master, x, y, width, height, bg_color, on_select=None):
         self.canvas = Canvas(master, width=width, height=height, bg=bg_color, highlightthickness=0)
         self.canvas.place(x=x, y=y)
         self.width = width
@@ -252,6 +277,7 @@ class ImagePlaceholder:
         self.text_id = self.canvas.create_text(width // 2, height // 2, text=self.placeholder_text, fill="gray")
         self.canvas.bind("<Button-1>", self.add_image)
         self.master = master
+        self.on_select = on_select  # Called with the image path in the background, e.g. to precompute capacity
 
     def add_image(self, event):
         global file_path
@@ -263,6 +289,8 @@ class ImagePlaceholder:
                 img_tk = ImageTk.PhotoImage(img)
                 self.canvas.create_image(self.width // 2, self.height // 2, image=img_tk, anchor="center")
                 self.img_tk_reference = img_tk
+                if self.on_select:
+                    threading.Thread(target=self.on_select, args=(file_path,), daemon=True).start()
             except Exception as e:
                 custom_message_dialog(self.master, "Error", f"Failed to load image: {e}")
 
@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import base64
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+
+KEYSTORE_DIR = os.path.join(os.path.expanduser("~"), ".stealthcode")
+ROTATION_PERIOD = 30 * 24 * 60 * 60 # seconds before a stored key pair is replaced
+KEYSTORE_VERSION = 1
+
+
+class KeyStore:
+    """
+    Local keystore keeping a user's KEM key pair across launches.
+
+    The secret key is encrypted with ChaCha20-Poly1305 under a key derived
+    from the user's passphrase with scrypt. The algorithm, creation time and
+    public key are stored in clear but bound to the ciphertext as associated
+    data, so they cannot be swapped without detection.
+    """
+
+    def __init__(self, username:str, directory:str = KEYSTORE_DIR, rotation_period:int = ROTATION_PERIOD):
+        """
+        Args:
+            username: owner of the key pair, one keystore file per user.
+            directory: directory holding the keystore files.
+            rotation_period: age in seconds after which the key pair is rotated.
+        """
+        self.path = os.path.join(directory, f"{username}_keystore.json")
+        self.rotation_period = rotation_period
+
+    def derive_key(self, passphrase:str, salt:bytes) -> bytes:
+        """
+        Derive the keystore encryption key from the passphrase.
+
+        Args:
+            passphrase: the user's passphrase.
+            salt: random salt stored with the keystore.
+        """
+        return Scrypt(salt=salt, length=32, n=2**14, r=8, p=1).derive(passphrase.encode())
+
+    def load(self, passphrase:str, algorithm:str):
+        """
+        Load the stored key pair if it is usable.
+
+        Args:
+            passphrase: the user's passphrase.
+            algorithm: KEM algorithm the key pair must belong to.
+
+        Returns:
+            (public_key, secret_key), or None when there is no key pair, it is
+            due for rotation, belongs to another algorithm or cannot be decrypted.
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if data.get("version") != KEYSTORE_VERSION or data.get("algorithm") != algorithm:
+            return None
+        if time.time() - data["created"] >= self.rotation_period:
+            print("[*] Stored key pair is due for rotation.")
+            return None
+
+        public_key = base64.b64decode(data["public_key"])
+        key = self.derive_key(passphrase, base64.b64decode(data["salt"]))
+        try:
+            secret_key = ChaCha20Poly1305(key).decrypt(
+                base64.b64decode(data["nonce"]),
+                base64.b64decode(data["secret_key"]),
+                self.associated_data(algorithm, data["created"], public_key),
+            )
+        except InvalidTag:
+            print("[-] Keystore could not be decrypted, a new key pair will be generated.")
+            return None
+        return public_key, secret_key
+
+    def save(self, passphrase:str, algorithm:str, public_key:bytes, secret_key:bytes):
+        """
+        Encrypt and store a key pair, readable by the owner only.
+
+        Args:
+            passphrase: the user's passphrase.
+            algorithm: KEM algorithm of the key pair.
+            public_key: the public key.
+            secret_key: the secret key.
+        """
+        created = int(time.time())
+        salt, nonce = os.urandom(16), os.urandom(12)
+        key = self.derive_key(passphrase, salt)
+        encrypted_secret_key = ChaCha20Poly1305(key).encrypt(nonce, secret_key, self.associated_data(algorithm, created, public_key))
+
+        data = {
+            "version": KEYSTORE_VERSION,
+            "algorithm": algorithm,
+            "created": created,
+            "public_key": base64.b64encode(public_key).decode("utf-8"),
+            "salt": base64.b64encode(salt).decode("utf-8"),
+            "nonce": base64.b64encode(nonce).decode("utf-8"),
+            "secret_key": base64.b64encode(encrypted_secret_key).decode("utf-8"),
+        }
+
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        temporary_path = f"{self.path}.tmp"
+        with os.fdopen(os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=4)
+        os.replace(temporary_path, self.path)
+
+    def associated_data(self, algorithm:str, created:int, public_key:bytes) -> bytes:
+        """
+        Clear-text keystore fields authenticated together with the secret key.
+        """
+        return f"{KEYSTORE_VERSION}:{algorithm}:{created}:".encode() + public_key
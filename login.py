@@ -76,7 +76,7 @@ def login():
 
         # Improved subprocess handling
         try:
-            inint = user_selection.StealthCodeApp(users, username)
+            inint = user_selection.StealthCodeApp(users, username, password)
             inint.run()
 
 
@@ -118,60 +118,62 @@ def on_close():
         except Exception as e:
             print(f"Error during shutdown: {e}")
 
-# Main window setup
-root = Tk()
-root.title("Login Page")
-root.geometry("1100x700")
-root.configure(bg="#2b2b2b")
-
-# Custom font path
-font_path = r"assets/FasterOne-Regular.ttf"
-
-# Render the logo
-logo_with_custom_font(root, "STEALTHCODE", font_path, 72, "#2b2b2b", "#ffffff")
-
-# Create the login box
-login_frame = Frame(root, bg="#3c3f41", bd=0, relief=RAISED)
-login_frame.place(relx=0.5, rely=0.55, anchor="center", width=450, height=450)
-
-# Add a profile icon
-icon_path = r"assets/profile_icon.png"  
-try:
-    profile_img = Image.open(icon_path).resize((90, 90), Image.LANCZOS)
-    profile_photo = ImageTk.PhotoImage(profile_img)
-    icon_label = Label(login_frame, image=profile_photo, bg="#3c3f41")
-    icon_label.image = profile_photo
-    icon_label.place(x=175, y=10)
-except FileNotFoundError:
-    messagebox.showwarning("Icon Error", "Profile icon not found.")
-
-# "Login" text
-Label(login_frame, text="Login", font=("Helvetica", 14, "bold"), bg="#3c3f41", fg="#ffffff").place(x=190, y=120)
-
-# Username label and input with rounded corners
-Label(login_frame, text="Username", font=("Helvetica", 12), bg="#3c3f41", fg="#ffffff").place(x=50, y=160)
-username_canvas = Canvas(login_frame, bg="#3c3f41", highlightthickness=0, width=350, height=40)
-username_canvas.place(x=50, y=190)
-create_rounded_rectangle(username_canvas, 0, 0, 350, 40, radius=20, fill="#2b2b2b", outline="")
-username_entry = Entry(login_frame, font=("Helvetica", 12), bd=0, highlightthickness=0, bg="#2b2b2b", fg="#ffffff", insertbackground="#ffffff")
-username_entry.place(x=65, y=197, width=330, height=30)
-
-# Password label and input with rounded corners
-Label(login_frame, text="Password", font=("Helvetica", 12), bg="#3c3f41", fg="#ffffff").place(x=50, y=250)
-password_canvas = Canvas(login_frame, bg="#3c3f41", highlightthickness=0, width=350, height=40)
-password_canvas.place(x=50, y=280)
-create_rounded_rectangle(password_canvas, 0, 0, 350, 40, radius=20, fill="#2b2b2b", outline="")
-password_entry = Entry(login_frame, font=("Helvetica", 12), bd=0, highlightthickness=0 ,bg="#2b2b2b", fg="#ffffff", insertbackground="#ffffff", show="*")
-password_entry.place(x=65, y=287, width=330, height=30)
-
-# Custom Login Button with rounded corners
-login_button_canvas = Canvas(login_frame, bg="#3c3f41", highlightthickness=0, width=200, height=50)
-login_button_canvas.place(x=125, y=350)
-button_id = create_rounded_rectangle(login_button_canvas, 0, 0, 200, 50, radius=25, fill="#4a73ff", outline="")
-login_button_canvas.create_text(100, 25, text="Login", font=("Helvetica", 12, "bold"), fill="#ffffff")
-
-# Bind hover and click events to the button
-login_button_canvas.tag_bind(button_id, "<Button-1>", on_button_click)
-login_button_canvas.tag_bind(button_id, "<Enter>", on_button_hover)
-
-root.mainloop()
+# Only when run as a script: the steganography batch workers re-import the main module
+if __name__ == "__main__":
+    # Main window setup
+    root = Tk()
+    root.title("Login Page")
+    root.geometry("1100x700")
+    root.configure(bg="#2b2b2b")
+
+    # Custom font path
+    font_path = r"assets/FasterOne-Regular.ttf"
+
+    # Render the logo
+    logo_with_custom_font(root, "STEALTHCODE", font_path, 72, "#2b2b2b", "#ffffff")
+
+    # Create the login box
+    login_frame = Frame(root, bg="#3c3f41", bd=0, relief=RAISED)
+    login_frame.place(relx=0.5, rely=0.55, anchor="center", width=450, height=450)
+
+    # Add a profile icon
+    icon_path = r"assets/profile_icon.png"  
+    try:
+        profile_img = Image.open(icon_path).resize((90, 90), Image.LANCZOS)
+        profile_photo = ImageTk.PhotoImage(profile_img)
+        icon_label = Label(login_frame, image=profile_photo, bg="#3c3f41")
+        icon_label.image = profile_photo
+        icon_label.place(x=175, y=10)
+    except FileNotFoundError:
+        messagebox.showwarning("Icon Error", "Profile icon not found.")
+
+    # "Login" text
+    Label(login_frame, text="Login", font=("Helvetica", 14, "bold"), bg="#3c3f41", fg="#ffffff").place(x=190, y=120)
+
+    # Username label and input with rounded corners
+    Label(login_frame, text="Username", font=("Helvetica", 12), bg="#3c3f41", fg="#ffffff").place(x=50, y=160)
+    username_canvas = Canvas(login_frame, bg="#3c3f41", highlightthickness=0, width=350, height=40)
+    username_canvas.place(x=50, y=190)
+    create_rounded_rectangle(username_canvas, 0, 0, 350, 40, radius=20, fill="#2b2b2b", outline="")
+    username_entry = Entry(login_frame, font=("Helvetica", 12), bd=0, highlightthickness=0, bg="#2b2b2b", fg="#ffffff", insertbackground="#ffffff")
+    username_entry.place(x=65, y=197, width=330, height=30)
+
+    # Password label and input with rounded corners
+    Label(login_frame, text="Password", font=("Helvetica", 12), bg="#3c3f41", fg="#ffffff").place(x=50, y=250)
+    password_canvas = Canvas(login_frame, bg="#3c3f41", highlightthickness=0, width=350, height=40)
+    password_canvas.place(x=50, y=280)
+    create_rounded_rectangle(password_canvas, 0, 0, 350, 40, radius=20, fill="#2b2b2b", outline="")
+    password_entry = Entry(login_frame, font=("Helvetica", 12), bd=0, highlightthickness=0 ,bg="#2b2b2b", fg="#ffffff", insertbackground="#ffffff", show="*")
+    password_entry.place(x=65, y=287, width=330, height=30)
+
+    # Custom Login Button with rounded corners
+    login_button_canvas = Canvas(login_frame, bg="#3c3f41", highlightthickness=0, width=200, height=50)
+    login_button_canvas.place(x=125, y=350)
+    button_id = create_rounded_rectangle(login_button_canvas, 0, 0, 200, 50, radius=25, fill="#4a73ff", outline="")
+    login_button_canvas.create_text(100, 25, text="Login", font=("Helvetica", 12, "bold"), fill="#ffffff")
+
+    # Bind hover and click events to the button
+    login_button_canvas.tag_bind(button_id, "<Button-1>", on_button_click)
+    login_button_canvas.tag_bind(button_id, "<Enter>", on_button_hover)
+
+    root.mainloop()
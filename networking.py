@@ -5,6 +5,7 @@ from datetime import datetime
 
 LISTENING_PORT = 5001
 BUFFER_SIZE = 8192  # Smaller buffer size to reduce packet loss
+PARTIAL_SUFFIX = ".part"  # Suffix of files still being received
 
 class Networking:
     """Handles file transfer over the network."""
@@ -91,12 +92,15 @@ class Networking:
 
                 print(f"[+] Receiving file: {file_name}")
 
-                # Initialize save_path
+                # Initialize save_path; the file is written under a temporary name and
+                # renamed once complete, so watchers never see a partial file
                 save_path = os.path.join(self.SAVE_PATH, file_name)
+                partial_path = save_path + PARTIAL_SUFFIX
 
                 # Save the file
                 received_bytes = 0
-                with open(save_path, "wb") as file:
+                complete = False
+                with open(partial_path, "wb") as file:
                     while True:
                         data = conn.recv(self.BUFFER_SIZE)
                         if not data:
@@ -106,11 +110,19 @@ class Networking:
                         if data.endswith(b"<EOF>"):
                             file.write(data[:-5])  # Write data without the marker
                             received_bytes += len(data) - 5
+                            complete = True
                             break
                         file.write(data)
                         received_bytes += len(data)
                         print(f"[+] Received chunk size: {len(data)} bytes")
 
+                # A file cut off before its marker is never handed to the watchers, nor acknowledged
+                if not complete:
+                    os.remove(partial_path)
+                    print(f"[-] Connection closed before {file_name} was complete, {received_bytes} bytes discarded.")
+                    break
+                os.replace(partial_path, save_path)
+
                 print(f"[+] File received successfully: {save_path}")
                 print(f"[+] Received file size: {received_bytes} bytes")
 
@@ -136,12 +148,16 @@ class Networking:
         Send multiple files to the specified destination IP.
 
         Args:
-            file_paths (list): List of file paths to send.
+            file_paths (list): List of file paths to send, or (file_name, data) tuples
+                to send bytes-like data (e.g. a memoryview) straight from memory.
             dest_ip (str): Destination IP address.
+
+        Returns:
+            bool: True once every file was acknowledged by the receiver.
         """
-        if not all(os.path.isfile(file_path) for file_path in file_paths):
+        if not all(isinstance(file_path, tuple) or os.path.isfile(file_path) for file_path in file_paths):
             print("[-] One or more files not found.")
-            return
+            return False
 
         print(f"[*] Connecting to server at {dest_ip}:{self.LISTEN_PORT}")
         try:
@@ -150,7 +166,10 @@ class Networking:
                 print("[+] Connected to server")
 
                 for file_path in file_paths:
-                    file_name = os.path.basename(file_path)
+                    if isinstance(file_path, tuple):
+                        file_name, data = file_path
+                    else:
+                        file_name, data = os.path.basename(file_path), None
                     print(f"[*] Sending file: {file_name}")
 
                     # Send file name length
@@ -162,11 +181,10 @@ class Networking:
 
                     # Send file data
                     total_sent = 0
-                    with open(file_path, "rb") as file:
-                        while chunk := file.read(self.BUFFER_SIZE):
-                            client_socket.send(chunk)
-                            total_sent += len(chunk)
-                            print(f"[+] Sent chunk size: {len(chunk)} bytes")
+                    for chunk in self.iter_chunks(file_path if data is None else data):
+                        client_socket.sendall(chunk)
+                        total_sent += len(chunk)
+                        print(f"[+] Sent chunk size: {len(chunk)} bytes")
 
                     # Send end-of-file marker
                     client_socket.send(b"<EOF>")
@@ -177,8 +195,27 @@ class Networking:
                     ack = client_socket.recv(3)
                     if ack != b"ACK":
                         print(f"[-] Acknowledgment not received for {file_name}.")
-                        return
+                        return False
 
                 print("[+] All files sent successfully!")
+                return True
         except Exception as e:
-            print(f"[-] Error sending files: {e}")
\ No newline at end of file
+            print(f"[-] Error sending files: {e}")
+            return False
+
+    def iter_chunks(self, source):
+        """
+        Yield BUFFER_SIZE chunks of a file path or of bytes-like data.
+
+        Args:
+            source: file path (str) or bytes-like object; memoryviews are sliced without copying.
+        """
+        if isinstance(source, str):
+            with open(source, "rb") as file:
+                while chunk := file.read(self.BUFFER_SIZE):
+                    yield chunk
+            return
+
+        data = memoryview(source).cast("B")
+        for offset in range(0, len(data), self.BUFFER_SIZE):
+            yield data[offset:offset + self.BUFFER_SIZE]
@@ -1,7 +1,48 @@
 import cv2
 import numpy as np
+import hashlib
+import json
 import os
+import struct
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import multiprocessing
+from multiprocessing import shared_memory
+
+
+# Stego bitstream header: magic, format version, max adaptive level, flags, payload length.
+HEADER_MAGIC = b"SC"
+FORMAT_VERSION = 2
+MAX_LEVEL = 3
+HEADER_FORMAT = ">2sBBBI"
+HEADER_BITS = struct.calcsize(HEADER_FORMAT) * 8
+# Header layouts the extractor understands; version 1 had no flags.
+HEADER_FORMATS = {1: ">2sBBI", 2: HEADER_FORMAT}
+
+# Header flags
+FLAG_SHARD = 0x01 # payload is one shard of a message split across several images
+FLAG_COMPRESSED = 0x02 # plaintext was compressed before encryption
+FLAG_ENVELOPE = 0x04 # payload carries its own transmission key and nonce, no key file is sent
+FLAG_BATCH = 0x08 # plaintext is several coalesced messages, framed as netstrings
+
+# Lossless output encoders: name -> file extension. Lossy formats would destroy the payload.
+ENCODERS = {
+    "png": ".png",
+    "webp": ".webp",
+    "tiff": ".tiff",
+    "bmp": ".bmp",
+}
+
+# Start method of the embed_batch() worker pool. The caller may be a GUI process with
+# many threads, which a forked worker could inherit mid-lock; workers only need picklable
+# arguments and shared memory names, so they start clean instead.
+BATCH_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# Threads used for row tiles; images below TILE_MIN_PIXELS are processed as one tile.
+tile_workers = os.cpu_count() or 1
+TILE_MIN_PIXELS = 1 << 20
 
 
 def calculate_edge_strength(image_array:np):
@@ -16,21 +57,13 @@ def calculate_edge_strength(image_array:np):
     return np.sqrt(gradient_x**2 + gradient_y**2)
 
 
-def embed_data_adaptive(image_path:str, encrypted_message:bytes, output_path:str):
+def adaptive_level_map(image:np.ndarray) -> np.ndarray:
     """
-    Embed secret data in a color image using Adaptive LSB Steganography.
-    
+    Compute the number of LSBs (1 to 3) used in every pixel of a BGR image.
+
     Args:
-        image_path: path of the image where data to be embedded.
-        encrypted_message: the message to be embedded.
-        output_path: image path where to save the image.
+        image: numpy array of the BGR image.
     """
-    # Load image in RGB (BGR in OpenCV)
-    image = cv2.imread(image_path)
-    if image is None:
-        # Handle a function of message box here.
-        raise ValueError("Image not found or format not supported.")
-
     # Split image into channels (B, G, R)
     b_channel, g_channel, r_channel = cv2.split(image)
 
@@ -41,53 +74,660 @@ def embed_data_adaptive(image_path:str, encrypted_message:bytes, output_path:str
 
     # Combine edge strengths and normalize to adaptive levels
     combined_edge_strength = (edge_strength_b + edge_strength_g + edge_strength_r) / 3
-    adaptive_levels = np.clip((combined_edge_strength / np.max(combined_edge_strength) * 3).astype(int), 1, 3)
+    return np.clip((combined_edge_strength / np.max(combined_edge_strength) * 3).astype(int), 1, 3).astype(np.uint8)
+
+
+def row_tiles(image:np.ndarray, rows:int = None):
+    """
+    Split the leading rows of an image into one (start, end) tile per worker.
+
+    Args:
+        image: numpy array of the image.
+        rows: number of leading rows to split, defaults to the whole image.
+    """
+    rows = image.shape[0] if rows is None else rows
+    count = tile_workers if rows * image.shape[1] >= TILE_MIN_PIXELS else 1
+    count = max(1, min(count, rows))
+    bounds = np.linspace(0, rows, count + 1).astype(int)
+    return [(int(bounds[i]), int(bounds[i + 1])) for i in range(count)]
+
+
+def map_tiles(function, tiles:list) -> list:
+    """
+    Call function(row_start, row_end) for every tile, on a thread pool when
+    there is more than one.
+
+    OpenCV filters and most NumPy array operations release the GIL, so
+    independent row tiles run in parallel.
+
+    Args:
+        function: callable taking the tile's start and end rows.
+        tiles: list of (start, end) row ranges from row_tiles().
+    """
+    if len(tiles) == 1:
+        return [function(*tiles[0])]
+    with ThreadPoolExecutor(max_workers=len(tiles)) as executor:
+        return list(executor.map(lambda tile: function(*tile), tiles))
+
+
+def stripe_edge_strength(image:np.ndarray, row_start:int, row_end:int) -> np.ndarray:
+    """
+    Combined B, G, R edge strength of image rows [row_start, row_end).
+
+    Runs one int16 Sobel pass over the BGR stripe plus a one-row halo. The
+    integer gradients are exact, so the result equals the CV_64F path of
+    adaptive_level_map() while only holding one stripe of temporaries.
+
+    Args:
+        image: numpy array of the BGR image.
+        row_start: first row of the stripe.
+        row_end: row after the last row of the stripe.
+    """
+    halo_start = max(row_start - 1, 0)
+    halo_end = min(row_end + 1, image.shape[0])
+    stripe = image[halo_start:halo_end]
+
+    gradient_x = cv2.Sobel(stripe, cv2.CV_16S, 1, 0, ksize=3).astype(np.int32)
+    gradient_y = cv2.Sobel(stripe, cv2.CV_16S, 0, 1, ksize=3).astype(np.int32)
+    magnitude = np.sqrt((gradient_x * gradient_x + gradient_y * gradient_y).astype(np.float64))
+
+    combined_edge_strength = (magnitude[..., 0] + magnitude[..., 1] + magnitude[..., 2]) / 3
+    return combined_edge_strength[row_start - halo_start:row_end - halo_start]
+
+
+def adaptive_level_map_striped(image:np.ndarray, stripe_rows:int = 256) -> np.ndarray:
+    """
+    Low-memory variant of adaptive_level_map() with an identical result.
+
+    Works in row stripes: a first pass finds the global maximum edge strength,
+    a second pass recomputes each stripe and quantizes it, trading a second
+    Sobel pass for peak memory proportional to stripe_rows.
+
+    Args:
+        image: numpy array of the BGR image.
+        stripe_rows: number of rows processed at once.
+    """
+    height = image.shape[0]
+    stripes = [(row_start, min(row_start + stripe_rows, height)) for row_start in range(0, height, stripe_rows)]
+
+    max_edge_strength = max(stripe_edge_strength(image, row_start, row_end).max() for row_start, row_end in stripes)
+
+    adaptive_levels = np.empty(image.shape[:2], dtype=np.uint8)
+    for row_start, row_end in stripes:
+        combined_edge_strength = stripe_edge_strength(image, row_start, row_end)
+        adaptive_levels[row_start:row_end] = np.clip((combined_edge_strength / max_edge_strength * 3).astype(int), 1, 3)
+    return adaptive_levels
+
+
+def adaptive_level_map_tiled(image:np.ndarray) -> np.ndarray:
+    """
+    Thread-parallel variant of adaptive_level_map() with an identical result.
+
+    Args:
+        image: numpy array of the BGR image.
+    """
+    tiles = row_tiles(image)
+    edge_strengths = dict(zip(tiles, map_tiles(lambda row_start, row_end: stripe_edge_strength(image, row_start, row_end), tiles)))
+    max_edge_strength = max(combined_edge_strength.max() for combined_edge_strength in edge_strengths.values())
+
+    adaptive_levels = np.empty(image.shape[:2], dtype=np.uint8)
+
+    def quantize(row_start, row_end):
+        combined_edge_strength = edge_strengths[(row_start, row_end)]
+        adaptive_levels[row_start:row_end] = np.clip((combined_edge_strength / max_edge_strength * 3).astype(int), 1, 3)
+
+    map_tiles(quantize, tiles)
+    return adaptive_levels
+
+
+class LevelMapCache:
+    """
+    Bounded LRU cache of adaptive level maps keyed by image content.
+
+    Entries live in memory up to max_bytes. With a cache_dir, maps are also
+    saved as .npy files and memory-mapped back on a memory miss, with the
+    least recently used files removed past max_disk_bytes.
+    """
+
+    def __init__(self, max_bytes:int = 256 * 1024 * 1024, cache_dir:str = None, max_disk_bytes:int = 2 * 1024 * 1024 * 1024):
+        """
+        Args:
+            max_bytes: memory budget for cached maps.
+            cache_dir: directory of the on-disk tier, None to keep maps in memory only.
+            max_disk_bytes: disk budget for the on-disk tier.
+        """
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.disk_lock = threading.Lock() # serializes trimming of the on-disk tier
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(masked_image:np.ndarray) -> str:
+        """
+        Content hash of an image whose embedding bits are already cleared.
+
+        Args:
+            masked_image: numpy array of the masked BGR image.
+        """
+        digest = hashlib.blake2b(str(masked_image.shape).encode(), digest_size=20)
+        digest.update(np.ascontiguousarray(masked_image).data)
+        return digest.hexdigest()
+
+    def get(self, key:str):
+        """
+        Return the cached level map for key, or None.
+
+        Args:
+            key: content hash from LevelMapCache.key().
+        """
+        with self.lock:
+            adaptive_levels = self.entries.get(key)
+            if adaptive_levels is not None:
+                self.entries.move_to_end(key)
+                return adaptive_levels
+
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, f"{key}.npy")
+            # A file trimmed or unreadable under us is just a miss
+            try:
+                adaptive_levels = np.load(path, mmap_mode="r")
+                os.utime(path)
+            except (OSError, ValueError, EOFError):
+                return None
+            self._remember(key, adaptive_levels)
+            return adaptive_levels
+        return None
+
+    def put(self, key:str, adaptive_levels:np.ndarray):
+        """
+        Store a level map under key.
+
+        Args:
+            key: content hash from LevelMapCache.key().
+            adaptive_levels: per-pixel level map to cache.
+        """
+        adaptive_levels.flags.writeable = False
+        self._remember(key, adaptive_levels)
+        if self.cache_dir:
+            # Written under a private name and renamed, so readers never see a partial file
+            path = os.path.join(self.cache_dir, f"{key}.npy")
+            temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(temporary_path, "wb") as file:
+                    np.save(file, adaptive_levels)
+                os.replace(temporary_path, path)
+            except OSError as e:
+                print(f"[-] Could not cache level map on disk: {e}")
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+                return
+            self._trim_disk()
+
+    def clear(self):
+        """Drop every in-memory entry."""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _remember(self, key, adaptive_levels):
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key).nbytes
+            self.entries[key] = adaptive_levels
+            self.size += adaptive_levels.nbytes
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.nbytes
+
+    def _trim_disk(self):
+        with self.disk_lock:
+            files = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".npy"):
+                    path = os.path.join(self.cache_dir, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+            files.sort()
+            total = sum(size for _, size, _ in files)
+            while total > self.max_disk_bytes and len(files) > 1:
+                _, size, path = files.pop(0)
+                total -= size
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+level_map_cache = LevelMapCache()
+
+# Rows per stripe for the low-memory level map, None to filter the whole image at once.
+low_memory_stripe_rows = None
+
+
+def cover_level_map(image:np.ndarray) -> np.ndarray:
+    """
+    Level map used by the current stego format, served from level_map_cache.
+
+    The map is computed with the low MAX_LEVEL bits cleared, so embedding
+    leaves it unchanged for the receiver and a cover and the stego images
+    made from it share one cache entry.
+
+    Args:
+        image: numpy array of the BGR image.
+    """
+    masked_image = image & np.uint8((0xFF << MAX_LEVEL) & 0xFF)
+    key = LevelMapCache.key(masked_image)
+    adaptive_levels = level_map_cache.get(key)
+    if adaptive_levels is None:
+        if low_memory_stripe_rows:
+            adaptive_levels = adaptive_level_map_striped(masked_image, low_memory_stripe_rows)
+        elif len(row_tiles(masked_image)) > 1:
+            adaptive_levels = adaptive_level_map_tiled(masked_image)
+        else:
+            adaptive_levels = adaptive_level_map(masked_image)
+        level_map_cache.put(key, adaptive_levels)
+    return adaptive_levels
+
 
-    # Convert secret data to binary
-    secret_binary = ''.join(format(byte, '08b') for byte in encrypted_message) + '11111111'  # Unique delimiter
-    if len(secret_binary) > image.size * 3:
+def sample_bit_offsets(adaptive_levels:np.ndarray):
+    """
+    Map every B, G, R sample of the level map to the offset of its first payload bit.
+
+    Samples are filled pixel by pixel in row-major order and B, G, R order
+    inside a pixel, each one taking as many bits as its pixel's adaptive level.
+
+    Args:
+        adaptive_levels: per-pixel level map from adaptive_level_map().
+
+    Returns:
+        (offsets, levels): flat int64 offsets and uint8 levels, one entry per sample.
+    """
+    pixel_levels = adaptive_levels.ravel()
+    pixel_bits = pixel_levels.astype(np.int64) * 3
+    pixel_offsets = np.cumsum(pixel_bits) - pixel_bits
+    offsets = pixel_offsets[:, None] + np.arange(3, dtype=np.int64) * pixel_levels[:, None]
+    return offsets.ravel(), np.repeat(pixel_levels, 3)
+
+
+def embed_bits(samples:np.ndarray, offsets:np.ndarray, levels:np.ndarray, bits:np.ndarray):
+    """
+    Write a bit array into the low bits of a flat uint8 sample array, in place.
+
+    Bit k of the stream lands in bit position (k - offset) of the sample whose
+    range [offset, offset + level) contains k. Bits past the end of the
+    samples are dropped.
+
+    Args:
+        samples: flat view of the BGR pixels to modify.
+        offsets: per-sample bit offsets from sample_bit_offsets().
+        levels: per-sample adaptive levels from sample_bit_offsets().
+        bits: uint8 array of 0/1 values to embed.
+    """
+    for bit_position in range(3):
+        positions = offsets + bit_position
+        index = np.flatnonzero((levels > bit_position) & (positions < bits.size))
+        clear_mask = np.uint8(0xFF ^ (1 << bit_position))
+        samples[index] = (samples[index] & clear_mask) | (bits[positions[index]] << bit_position)
+
+
+def extract_bits(samples:np.ndarray, offsets:np.ndarray, levels:np.ndarray, n_bits:int = None) -> np.ndarray:
+    """
+    Read the low bits of a flat uint8 sample array back into a bit array.
+
+    Inverse of embed_bits() for the same offsets and levels.
+
+    Args:
+        samples: flat view of the BGR pixels to read.
+        offsets: per-sample bit offsets from sample_bit_offsets().
+        levels: per-sample adaptive levels from sample_bit_offsets().
+        n_bits: number of bits to read, defaults to every bit the samples hold.
+    """
+    if n_bits is None:
+        n_bits = int(offsets[-1] + levels[-1]) if offsets.size else 0
+    bits = np.zeros(n_bits, dtype=np.uint8)
+    for bit_position in range(3):
+        positions = offsets + bit_position
+        index = np.flatnonzero((levels > bit_position) & (positions < n_bits))
+        bits[positions[index]] = (samples[index] >> bit_position) & 1
+    return bits
+
+
+def row_bands(height:int, first_band:int = 8):
+    """
+    Yield (start, end) row ranges covering an image, doubling in height.
+
+    Lets readers stop early on small payloads without paying per-row overhead
+    on large ones.
+
+    Args:
+        height: number of rows in the image.
+        first_band: number of rows in the first band.
+    """
+    row_start, band = 0, first_band
+    while row_start < height:
+        row_end = min(row_start + band, height)
+        yield row_start, row_end
+        row_start, band = row_end, band * 2
+
+
+def pack_header(payload_length:int, flags:int = 0) -> bytes:
+    """
+    Build the header embedded ahead of the payload.
+
+    Args:
+        payload_length: payload size in bytes.
+        flags: FLAG_* bits describing the payload.
+    """
+    return struct.pack(HEADER_FORMAT, HEADER_MAGIC, FORMAT_VERSION, MAX_LEVEL, flags, payload_length)
+
+
+def parse_header(header:bytes):
+    """
+    Parse a header built by pack_header() or by an older format version.
+
+    Args:
+        header: the first HEADER_BITS // 8 bytes of the bitstream.
+
+    Returns:
+        (payload_length, flags, header_bits), or None if the bitstream has no
+        header (images written before the header existed).
+    """
+    if header[:2] != HEADER_MAGIC:
+        return None
+    version, max_level = header[2], header[3]
+    if version not in HEADER_FORMATS or max_level != MAX_LEVEL:
+        raise ValueError(f"Unsupported stego format (version {version}, max level {max_level}).")
+
+    header_format = HEADER_FORMATS[version]
+    fields = struct.unpack_from(header_format, header)
+    flags = fields[3] if version >= 2 else 0
+    return fields[-1], flags, struct.calcsize(header_format) * 8
+
+
+class CapacityMap:
+    """
+    Adaptive bit capacity of a cover image.
+
+    Holds the level map together with the cumulative bit offset at the start
+    of every row, so a capacity check and an embed can share one Sobel pass.
+    """
+
+    def __init__(self, adaptive_levels:np.ndarray):
+        """
+        Args:
+            adaptive_levels: per-pixel level map from adaptive_level_map().
+        """
+        self.adaptive_levels = adaptive_levels
+        self.shape = adaptive_levels.shape
+        # row_offsets[r] is the first bit stored in row r; the last entry is the total capacity.
+        row_bits = adaptive_levels.sum(axis=1, dtype=np.int64) * 3
+        self.row_offsets = np.concatenate((np.zeros(1, dtype=np.int64), np.cumsum(row_bits)))
+
+    @property
+    def bits(self) -> int:
+        """Total number of bits the image can hold, header included."""
+        return int(self.row_offsets[-1])
+
+    @property
+    def payload_bytes(self) -> int:
+        """Largest payload in bytes that fits behind the header."""
+        return max(0, (self.bits - HEADER_BITS) // 8)
+
+    def fits(self, payload_length:int) -> bool:
+        """
+        Check whether a payload of payload_length bytes fits in the image.
+
+        Args:
+            payload_length: payload size in bytes.
+        """
+        return payload_length <= self.payload_bytes
+
+    def rows_for(self, n_bits:int) -> int:
+        """
+        Number of leading image rows needed to hold n_bits.
+
+        Args:
+            n_bits: number of bits to store from the start of the image.
+        """
+        if n_bits > self.bits:
+            raise ValueError("Message too large for the selected image.")
+        return max(1, int(np.searchsorted(self.row_offsets, n_bits)))
+
+
+def capacity(image_path:str) -> CapacityMap:
+    """
+    Compute the exact adaptive capacity of a cover image.
+
+    Args:
+        image_path: path of the cover image.
+    """
+    image = cv2.imread(image_path)
+    if image is None:
         # Handle a function of message box here.
         raise ValueError("Image not found or format not supported.")
+    return CapacityMap(cover_level_map(image))
+
+
+def read_leading_bits(image:np.ndarray, capacity_map:CapacityMap, n_bits:int) -> np.ndarray:
+    """
+    Gather the first n_bits of the bitstream, touching only the rows that hold them.
+
+    Args:
+        image: numpy array of the BGR stego image.
+        capacity_map: capacity map of the image.
+        n_bits: number of bits to read.
+    """
+    bits = np.empty(n_bits, dtype=np.uint8)
+
+    def read_tile(row_start, row_end):
+        bit_start = capacity_map.row_offsets[row_start]
+        bit_end = min(capacity_map.row_offsets[row_end], n_bits)
+        offsets, levels = sample_bit_offsets(capacity_map.adaptive_levels[row_start:row_end])
+        bits[bit_start:bit_end] = extract_bits(image[row_start:row_end].reshape(-1), offsets, levels, bit_end - bit_start)
+
+    map_tiles(read_tile, row_tiles(image, capacity_map.rows_for(n_bits)))
+    return bits
+
+
+def write_leading_bits(image:np.ndarray, capacity_map:CapacityMap, bits:np.ndarray):
+    """
+    Embed a bit array from the start of the bitstream, touching only the rows that hold it.
+
+    Every tile knows its first bit from capacity_map.row_offsets, so tiles
+    are written independently and in parallel.
+
+    Args:
+        image: numpy array of the BGR image, modified in place.
+        capacity_map: capacity map of the image.
+        bits: uint8 array of 0/1 values to embed.
+    """
+    def write_tile(row_start, row_end):
+        bit_start = capacity_map.row_offsets[row_start]
+        bit_end = capacity_map.row_offsets[row_end]
+        offsets, levels = sample_bit_offsets(capacity_map.adaptive_levels[row_start:row_end])
+        embed_bits(image[row_start:row_end].reshape(-1), offsets, levels, bits[bit_start:bit_end])
+
+    map_tiles(write_tile, row_tiles(image, capacity_map.rows_for(bits.size)))
+
+
+def embed_image(image:np.ndarray, encrypted_message:bytes, capacity_map:CapacityMap = None, flags:int = 0):
+    """
+    Embed secret data in a decoded BGR image, in place.
+
+    Args:
+        image: numpy array of the BGR cover image.
+        encrypted_message: the message to be embedded.
+        capacity_map: capacity map of the image to reuse instead of recomputing it.
+        flags: FLAG_* bits stored in the header.
+    """
+    if capacity_map is None:
+        capacity_map = CapacityMap(cover_level_map(image))
+    elif capacity_map.shape != image.shape[:2]:
+        raise ValueError("Capacity map does not match the image.")
+
+    if not capacity_map.fits(len(encrypted_message)):
+        # Handle a function of message box here.
+        raise ValueError("Message too large for the selected image.")
+
+    # Convert header and secret data to binary
+    secret_data = pack_header(len(encrypted_message), flags) + encrypted_message
+    secret_bits = np.unpackbits(np.frombuffer(secret_data, dtype=np.uint8))
+
+    # Embed data in all channels (B, G, R samples of the interleaved image)
+    write_leading_bits(image, capacity_map, secret_bits)
+
+
+def extract_image(image:np.ndarray, with_flags:bool = False):
+    """
+    Extract secret data from a decoded BGR stego image.
+
+    Args:
+        image: numpy array of the BGR stego image.
+        with_flags: return (data, flags) instead of the data alone.
+    """
+    capacity_map = CapacityMap(cover_level_map(image))
+
+    # Read the header, then exactly the payload bits it announces
+    header = np.packbits(read_leading_bits(image, capacity_map, HEADER_BITS)).tobytes()
+    parsed = parse_header(header)
+    if parsed is None:
+        byte_array, flags = extract_delimited_data(image), 0
+    else:
+        payload_length, flags, header_bits = parsed
+        secret_bits = read_leading_bits(image, capacity_map, header_bits + payload_length * 8)
+        byte_array = np.packbits(secret_bits[header_bits:]).tobytes()
+        if not byte_array:
+            # Handle a function of message box here.
+            raise ValueError("Image not found or format not supported.")
+
+    return (byte_array, flags) if with_flags else byte_array
 
 
-    # Embed data in all channels (cycling through B, G, R)
-    secret_index = 0
-    channels = [b_channel, g_channel, r_channel]
-    for i in range(image.shape[0]):
-        for j in range(image.shape[1]):
-            if secret_index >= len(secret_binary):
-                break
+def encoder_for_path(output_path:str) -> str:
+    """
+    Name of the lossless encoder matching an output file extension.
 
-            for channel_index, channel in enumerate(channels):
-                if secret_index >= len(secret_binary):
-                    break
+    Args:
+        output_path: image path where to save the image.
+    """
+    extension = os.path.splitext(output_path)[1].lower()
+    extension = ".tiff" if extension == ".tif" else extension
+    for encoder, encoder_extension in ENCODERS.items():
+        if encoder_extension == extension:
+            return encoder
+    raise ValueError(f"Unsupported stego image format '{extension}', use one of {', '.join(ENCODERS.values())}.")
 
-                # Get adaptive level for the current pixel
-                adaptive_level = adaptive_levels[i, j]
 
-                # Modify pixel value
-                pixel_value = int(channel[i, j])  # Start with the current channel
-                for bit_position in range(adaptive_level):
-                    if secret_index >= len(secret_binary):
-                        break
-                    pixel_value = (pixel_value & ~(1 << bit_position)) | (int(secret_binary[secret_index]) << bit_position)
-                    secret_index += 1
+def encode_image(image:np.ndarray, encoder:str = "png", compression:int = None) -> memoryview:
+    """
+    Encode a stego image with a lossless encoder.
 
-                channel[i, j] = np.uint8(np.clip(pixel_value, 0, 255))
+    Args:
+        image: numpy array of the BGR stego image.
+        encoder: one of ENCODERS.
+        compression: PNG compression level (0 to 9) or TIFF compression scheme
+            (e.g. 1 none, 5 LZW, 8 Deflate); None keeps the OpenCV default.
 
-    # Merge channels back into an RGB image
-    stego_image = cv2.merge((b_channel, g_channel, r_channel))
+    Returns:
+        memoryview over the encoded image bytes.
+    """
+    if encoder not in ENCODERS:
+        raise ValueError(f"Unknown encoder '{encoder}', use one of {', '.join(ENCODERS)}.")
+
+    params = []
+    if encoder == "png" and compression is not None:
+        params = [cv2.IMWRITE_PNG_COMPRESSION, compression]
+    elif encoder == "tiff" and compression is not None:
+        params = [cv2.IMWRITE_TIFF_COMPRESSION, compression]
+    elif encoder == "webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, 101]  # Quality above 100 selects lossless WebP
+
+    success, buffer = cv2.imencode(ENCODERS[encoder], image, params)
+    if not success:
+        raise ValueError("Failed to encode the stego image.")
+    return memoryview(buffer)
+
+
+def embed_data_adaptive(image_path:str, encrypted_message:bytes, output_path:str, capacity_map:CapacityMap = None, compression:int = None, flags:int = 0):
+    """
+    Embed secret data in a color image using Adaptive LSB Steganography.
+    
+    Args:
+        image_path: path of the image where data to be embedded.
+        encrypted_message: the message to be embedded.
+        output_path: image path where to save the image; its extension selects the encoder.
+        capacity_map: capacity(image_path) result to reuse instead of recomputing it.
+        compression: encoder compression setting, see encode_image().
+        flags: FLAG_* bits stored in the header.
+    """
+    encoder = encoder_for_path(output_path)
+
+    # Load image in RGB (BGR in OpenCV)
+    image = cv2.imread(image_path)
+    if image is None:
+        # Handle a function of message box here.
+        raise ValueError("Image not found or format not supported.")
+
+    embed_image(image, encrypted_message, capacity_map, flags)
 
     # Save the stego image
-    cv2.imwrite(output_path, stego_image)
+    with open(output_path, "wb") as file:
+        file.write(encode_image(image, encoder, compression))
     print(f"Data embedded successfully in {output_path}")
 
 
-def extract_data_adaptive(stego_image_path:str):
+def load_cover(image_path:str) -> np.ndarray:
+    """
+    Load a cover image for embedding.
+
+    Args:
+        image_path: path of the cover image.
+
+    Returns:
+        numpy array of the BGR image.
+    """
+    # Load image in RGB (BGR in OpenCV)
+    image = cv2.imread(image_path)
+    if image is None:
+        # Handle a function of message box here.
+        raise ValueError("Image not found or format not supported.")
+    return image
+
+
+def embed_to_bytes(image_path:str, encrypted_message:bytes, capacity_map:CapacityMap = None, encoder:str = "png", compression:int = None, flags:int = 0) -> memoryview:
+    """
+    Embed secret data in a color image and return the encoded image without touching disk.
+
+    Args:
+        image_path: path of the image where data to be embedded.
+        encrypted_message: the message to be embedded.
+        capacity_map: capacity(image_path) result to reuse instead of recomputing it.
+        encoder: one of ENCODERS.
+        compression: encoder compression setting, see encode_image().
+        flags: FLAG_* bits stored in the header.
+
+    Returns:
+        memoryview over the encoded image bytes.
+    """
+    image = load_cover(image_path)
+    embed_image(image, encrypted_message, capacity_map, flags)
+    return encode_image(image, encoder, compression)
+
+
+def extract_data_adaptive(stego_image_path:str, with_flags:bool = False):
     """
     Extract secret data from a color stego image.
     Args:
         stego_image_path: saved image path.
+        with_flags: return (data, flags) instead of the data alone.
     """
     # Load stego image in RGB (BGR in OpenCV)
 
@@ -100,41 +740,325 @@ def extract_data_adaptive(stego_image_path:str):
         # Handle a function of message box here.
         raise ValueError("Image not found or format not supported.")
 
-    # Extract channels
-    b_channel, g_channel, r_channel = cv2.split(image)
+    return extract_image(image, with_flags)
 
-    # Calculate edge strength for combined channels
-    edge_strength_b = calculate_edge_strength(b_channel)
-    edge_strength_g = calculate_edge_strength(g_channel)
-    edge_strength_r = calculate_edge_strength(r_channel)
-    combined_edge_strength = (edge_strength_b + edge_strength_g + edge_strength_r) / 3
 
-    # Normalize edge strength to adaptive levels
-    adaptive_levels = np.clip((combined_edge_strength / np.max(combined_edge_strength) * 3).astype(int), 1, 3)
-
-    # Extract binary data
-    secret_binary = ''
-    channels = [b_channel, g_channel, r_channel]
-    for i in range(b_channel.shape[0]):
-        for j in range(b_channel.shape[1]):
-            for channel in channels:
-                pixel_value = channel[i, j]
-                adaptive_level = adaptive_levels[i, j]
-
-                for bit_position in range(adaptive_level):
-                    secret_binary += str((pixel_value >> bit_position) & 1)
-
-    # Convert binary to bytes
-    byte_array = bytearray()
-    for i in range(0, len(secret_binary), 8):
-        byte = secret_binary[i:i+8]
-        if byte == '11111111':  # Unique delimiter
+def extract_from_bytes(stego_image:bytes, with_flags:bool = False):
+    """
+    Extract secret data from an encoded stego image held in memory.
+
+    Args:
+        stego_image: encoded image bytes, e.g. from embed_to_bytes().
+        with_flags: return (data, flags) instead of the data alone.
+    """
+    image = cv2.imdecode(np.frombuffer(stego_image, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        # Handle a function of message box here.
+        raise ValueError("Image not found or format not supported.")
+
+    return extract_image(image, with_flags)
+
+
+def extract_delimited_data(image:np.ndarray) -> bytes:
+    """
+    Extract secret data from a stego image written with the 0xFF delimiter
+    instead of a header.
+
+    Args:
+        image: numpy array of the BGR stego image.
+    """
+    adaptive_levels = adaptive_level_map(image)
+
+    # Extract binary data band by band and stop at the delimiter byte
+    samples = image.reshape(image.shape[0], -1)
+    secret_bits = np.empty(0, dtype=np.uint8)
+    byte_chunks = []
+    for row_start, row_end in row_bands(image.shape[0]):
+        offsets, levels = sample_bit_offsets(adaptive_levels[row_start:row_end])
+        band_bits = extract_bits(samples[row_start:row_end].reshape(-1), offsets, levels)
+        secret_bits = np.concatenate((secret_bits, band_bits))
+
+        # Convert complete bytes to binary
+        complete = secret_bits.size // 8 * 8
+        new_bytes = np.packbits(secret_bits[:complete])
+        secret_bits = secret_bits[complete:]
+
+        delimiter = np.flatnonzero(new_bytes == 0xFF)  # Unique delimiter
+        if delimiter.size:
+            byte_chunks.append(new_bytes[:delimiter[0]].tobytes())
+            break
+        byte_chunks.append(new_bytes.tobytes())
+
+    byte_array = b''.join(byte_chunks)
+    if not byte_array:
+        # Handle a function of message box here.
+        raise ValueError("Image not found or format not supported.")
+
+    return byte_array
+
+
+def open_raw_image(path:str, mode:str = "r") -> np.ndarray:
+    """
+    Memory-map a raw BGR image without reading it into RAM.
+
+    Accepts a .npy file of shape (height, width, 3), or a headerless raw BGR
+    file described by a sidecar "<path>.json" holding its height and width.
+
+    Args:
+        path: path of the .npy or raw image.
+        mode: numpy memmap mode, "r" to read or "r+" to modify in place.
+    """
+    if path.endswith(".npy"):
+        image = np.load(path, mmap_mode=mode)
+    else:
+        with open(f"{path}.json", "r", encoding="utf-8") as file:
+            header = json.load(file)
+        image = np.memmap(path, dtype=np.uint8, mode=mode, shape=(header["height"], header["width"], 3))
+
+    if image.dtype != np.uint8 or image.ndim != 3 or image.shape[2] != 3:
+        raise ValueError("Image not found or format not supported.")
+    return image
+
+
+def create_raw_image(path:str, shape:tuple) -> np.ndarray:
+    """
+    Create a memory-mapped raw BGR image, as .npy or raw bytes plus a sidecar header.
+
+    Args:
+        path: path of the image to create.
+        shape: (height, width, 3) of the image.
+    """
+    if path.endswith(".npy"):
+        return np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=shape)
+
+    with open(f"{path}.json", "w", encoding="utf-8") as file:
+        json.dump({"height": shape[0], "width": shape[1]}, file)
+    return np.memmap(path, dtype=np.uint8, mode="w+", shape=shape)
+
+
+def stream_stripes(image:np.ndarray, stripe_rows:int):
+    """
+    Yield (row_start, row_end, edge_strength) for every stripe of a memory-mapped image.
+
+    Only the stripe and its one-row halo are read, with the low MAX_LEVEL
+    bits cleared as in cover_level_map().
+
+    Args:
+        image: memory-mapped BGR image.
+        stripe_rows: number of rows read at once.
+    """
+    mask = np.uint8((0xFF << MAX_LEVEL) & 0xFF)
+    height = image.shape[0]
+    for row_start in range(0, height, stripe_rows):
+        row_end = min(row_start + stripe_rows, height)
+        halo_start = max(row_start - 1, 0)
+        halo = np.asarray(image[halo_start:min(row_end + 1, height)]) & mask
+        yield row_start, row_end, stripe_edge_strength(halo, row_start - halo_start, row_end - halo_start)
+
+
+def stream_level_maps(image:np.ndarray, stripe_rows:int):
+    """
+    Yield (row_start, row_end, adaptive_levels) stripe by stripe.
+
+    The stripes concatenate to cover_level_map() of the whole image. A first
+    pass finds the global maximum edge strength, so the image is filtered
+    twice but never held in memory.
+
+    Args:
+        image: memory-mapped BGR image.
+        stripe_rows: number of rows read at once.
+    """
+    max_edge_strength = max(edge_strength.max() for _, _, edge_strength in stream_stripes(image, stripe_rows))
+    for row_start, row_end, edge_strength in stream_stripes(image, stripe_rows):
+        yield row_start, row_end, np.clip((edge_strength / max_edge_strength * 3).astype(int), 1, 3).astype(np.uint8)
+
+
+def embed_data_streaming(image_path:str, encrypted_message:bytes, output_path:str, stripe_rows:int = 256):
+    """
+    Embed secret data in a memory-mapped raw cover with a bounded working set.
+
+    The cover is copied to the output stripe by stripe and each stripe is
+    written out as soon as its bits are embedded, so memory use does not
+    depend on the cover size. The result is the same image embed_data_adaptive()
+    would produce for the same pixels.
+
+    Args:
+        image_path: path of the .npy or raw cover image.
+        encrypted_message: the message to be embedded.
+        output_path: path of the .npy or raw stego image to write.
+        stripe_rows: number of rows processed at once.
+    """
+    image = open_raw_image(image_path)
+    stego_image = create_raw_image(output_path, image.shape)
+
+    secret_data = pack_header(len(encrypted_message)) + encrypted_message
+    secret_bits = np.unpackbits(np.frombuffer(secret_data, dtype=np.uint8))
+
+    bit_start = 0
+    for row_start, row_end, adaptive_levels in stream_level_maps(image, stripe_rows):
+        stripe = np.array(image[row_start:row_end])
+        if bit_start < secret_bits.size:
+            offsets, levels = sample_bit_offsets(adaptive_levels)
+            embed_bits(stripe.reshape(-1), offsets, levels, secret_bits[bit_start:])
+            bit_start += int(offsets[-1] + levels[-1])
+        stego_image[row_start:row_end] = stripe
+    stego_image.flush()
+    del stego_image
+
+    if bit_start < secret_bits.size:
+        os.remove(output_path)
+        if not output_path.endswith(".npy"):
+            os.remove(f"{output_path}.json") # sidecar header from create_raw_image()
+        # Handle a function of message box here.
+        raise ValueError("Message too large for the selected image.")
+    print(f"Data embedded successfully in {output_path}")
+
+
+def extract_data_streaming(stego_image_path:str, stripe_rows:int = 256) -> bytes:
+    """
+    Extract secret data from a memory-mapped raw stego image with a bounded working set.
+
+    Stops reading once the payload announced by the header is complete.
+
+    Args:
+        stego_image_path: path of the .npy or raw stego image.
+        stripe_rows: number of rows processed at once.
+    """
+    image = open_raw_image(stego_image_path)
+
+    chunks = []
+    n_read = 0
+    n_bits = None
+    for row_start, row_end, adaptive_levels in stream_level_maps(image, stripe_rows):
+        offsets, levels = sample_bit_offsets(adaptive_levels)
+        stripe_bits = extract_bits(np.asarray(image[row_start:row_end]).reshape(-1), offsets, levels)
+        chunks.append(stripe_bits)
+        n_read += stripe_bits.size
+
+        # Once the header is in, read exactly the payload it announces
+        if n_bits is None and n_read >= HEADER_BITS:
+            parsed = parse_header(np.packbits(np.concatenate(chunks)[:HEADER_BITS]).tobytes())
+            if parsed is None:
+                raise ValueError("Image not found or format not supported.")
+            payload_length, _, header_bits = parsed
+            n_bits = header_bits + payload_length * 8
+        if n_bits is not None and n_read >= n_bits:
             break
-        byte_array.append(int(byte, 2))
 
+    secret_bits = np.concatenate(chunks)
+    if n_bits is None or secret_bits.size < n_bits:
+        raise ValueError("Image not found or format not supported.")
+    byte_array = np.packbits(secret_bits[header_bits:n_bits]).tobytes()
     if not byte_array:
         # Handle a function of message box here.
         raise ValueError("Image not found or format not supported.")
 
-    return bytes(byte_array)
+    return byte_array
+
+
+def share_array(array:np.ndarray) -> shared_memory.SharedMemory:
+    """
+    Copy an array into a new shared memory block.
+
+    Args:
+        array: numpy array to share.
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block
+
+
+def attach_array(name:str, shape:tuple) -> np.ndarray:
+    """
+    Copy a uint8 array out of a shared memory block created by share_array().
+
+    Args:
+        name: name of the shared memory block.
+        shape: shape of the shared array.
+    """
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray(shape, dtype=np.uint8, buffer=block.buf).copy()
+    finally:
+        block.close()
+
+
+def init_batch_worker():
+    """Run each batch worker single-threaded; the pool already uses every core."""
+    global tile_workers
+    tile_workers = 1
+
+
+def embed_shared_cover(cover:tuple, encrypted_message:bytes, output_path:str, compression:int = None, flags:int = 0) -> str:
+    """
+    Batch worker: embed into a cover held in shared memory and write the stego image.
+
+    Args:
+        cover: (image block name, level map block name, image shape) from embed_batch().
+        encrypted_message: the message to be embedded.
+        output_path: image path where to save the image; its extension selects the encoder.
+        compression: encoder compression setting, see encode_image().
+        flags: FLAG_* bits stored in the header.
+    """
+    image_name, levels_name, shape = cover
+    image = attach_array(image_name, shape)
+    capacity_map = CapacityMap(attach_array(levels_name, shape[:2]))
+
+    embed_image(image, encrypted_message, capacity_map, flags)
+    with open(output_path, "wb") as file:
+        file.write(encode_image(image, encoder_for_path(output_path), compression))
+    return output_path
+
+
+def embed_batch(jobs:list, max_workers:int = None, compression:int = None, flags:int = 0):
+    """
+    Embed many messages on a process pool, yielding results as they complete.
+
+    Every distinct cover is decoded and filtered once in this process, then
+    shared with the workers through shared memory together with its level map.
+
+    Args:
+        jobs: list of (encrypted_message, image_path, output_path) tuples, optionally
+            with a fourth FLAG_* item overriding flags for that job.
+        max_workers: number of worker processes, defaults to the CPU count.
+        compression: encoder compression setting, see encode_image().
+        flags: FLAG_* bits stored in the header of every job.
+
+    Yields:
+        (job index, output path, error) with error None on success.
+    """
+    blocks = []
+    covers = {}
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(BATCH_START_METHOD), initializer=init_batch_worker) as executor:
+            futures = {}
+            for index, job in enumerate(jobs):
+                encrypted_message, image_path, output_path = job[:3]
+                job_flags = job[3] if len(job) > 3 else flags
+                try:
+                    if image_path not in covers:
+                        image = cv2.imread(image_path)
+                        if image is None:
+                            raise ValueError("Image not found or format not supported.")
+                        adaptive_levels = cover_level_map(image)
+                        image_block, levels_block = share_array(image), share_array(adaptive_levels)
+                        blocks.extend((image_block, levels_block))
+                        covers[image_path] = ((image_block.name, levels_block.name, image.shape), CapacityMap(adaptive_levels))
+
+                    cover, capacity_map = covers[image_path]
+                    if not capacity_map.fits(len(encrypted_message)):
+                        raise ValueError("Message too large for the selected image.")
+                except ValueError as e:
+                    yield index, output_path, e
+                    continue
+
+                future = executor.submit(embed_shared_cover, cover, encrypted_message, output_path, compression, job_flags)
+                futures[future] = (index, output_path)
 
+            for future in as_completed(futures):
+                index, output_path = futures[future]
+                yield index, output_path, future.exception()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
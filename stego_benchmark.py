@@ -0,0 +1,256 @@
+import argparse
+import os
+import time
+import tracemalloc
+import cv2
+import numpy as np
+import steganographic as stegano
+import benchmark_report
+from benchmark_report import print_table, write_json
+
+
+# Default suite: synthetic cover sizes in megapixels and payload sizes in bytes.
+# Payloads larger than a cover's capacity are skipped; the capacity limit itself is always run.
+SUITE_MEGAPIXELS = [0.3, 1, 2, 5, 12, 24, 50]
+SUITE_PAYLOADS = [64, 1024, 16 * 1024, 256 * 1024, 4 * 1024 * 1024]
+
+# Encoder settings compared by benchmark_encoders(): (encoder, compression)
+ENCODER_SETTINGS = [
+    ("png", 0),
+    ("png", 1),
+    ("png", 3),
+    ("png", 6),
+    ("png", 9),
+    ("webp", None),
+    ("tiff", 1),
+    ("tiff", 5),
+    ("tiff", 8),
+    ("bmp", None),
+]
+
+
+def synthetic_cover(height:int, width:int, seed:int = 0) -> np.ndarray:
+    """
+    Generate a photo-like BGR cover: smooth gradients with some texture.
+
+    Built from uint8 arrays only, so 50 MP covers stay cheap to create.
+
+    Args:
+        height: image height in pixels.
+        width: image width in pixels.
+        seed: random seed for the texture.
+    """
+    rng = np.random.default_rng(seed)
+    columns = (np.arange(width) * 200 // width).astype(np.uint8)
+    rows = (np.arange(height) * 200 // height).astype(np.uint8)
+
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[..., 0] = columns[None, :]
+    image[..., 1] = rows[:, None]
+    image[..., 2] = np.add.outer(rows // 2, columns // 2)
+
+    texture = rng.integers(0, 56, (height // 8 + 1, width // 8 + 1, 3), dtype=np.uint8)
+    texture = cv2.resize(texture, (width, height), interpolation=cv2.INTER_LINEAR)
+    return cv2.add(image, texture)
+
+
+def measure(function, repeat:int) -> dict:
+    """
+    Time a call and measure its peak traced memory.
+
+    The timed runs are untraced and the fastest one is reported. A separate
+    traced run gives the peak of NumPy and Python allocations; OpenCV's
+    internal buffers are not traced.
+
+    Args:
+        function: zero-argument callable to measure.
+        repeat: number of timed runs.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": min(timings), "peak_bytes": peak_bytes, "result": result}
+
+
+def benchmark_cover(image:np.ndarray, payload_sizes:list, repeat:int = 3, warm_cache:bool = False) -> list:
+    """
+    Benchmark the Sobel stage, embed and extract on one cover.
+
+    Args:
+        image: numpy array of the BGR cover image.
+        payload_sizes: payload sizes in bytes; sizes above capacity are skipped
+            and the capacity limit is always added.
+        repeat: number of timed runs per measurement.
+        warm_cache: keep level maps cached between runs instead of clearing them.
+
+    Returns:
+        One dict per stage and payload size.
+    """
+    def level_map():
+        if not warm_cache:
+            stegano.level_map_cache.clear()
+        return stegano.cover_level_map(image)
+
+    sobel = measure(level_map, repeat)
+    capacity_map = stegano.CapacityMap(sobel["result"])
+    cover = {"width": image.shape[1], "height": image.shape[0], "megapixels": round(image.shape[0] * image.shape[1] / 1e6, 2)}
+
+    results = [dict(cover, stage="sobel", payload_bytes=None, seconds=sobel["seconds"],
+                    bits_per_second=capacity_map.bits / sobel["seconds"], peak_bytes=sobel["peak_bytes"], output_bytes=None)]
+
+    sizes = sorted({size for size in payload_sizes if capacity_map.fits(size)} | {capacity_map.payload_bytes})
+    for size in sizes:
+        payload = os.urandom(size)
+        bits = size * 8
+
+        def embed():
+            if not warm_cache:
+                stegano.level_map_cache.clear()
+            stego_image = image.copy()
+            stegano.embed_image(stego_image, payload)
+            return stegano.encode_image(stego_image)
+
+        embedded = measure(embed, repeat)
+        encoded = embedded["result"]
+
+        def extract():
+            if not warm_cache:
+                stegano.level_map_cache.clear()
+            return stegano.extract_from_bytes(encoded)
+
+        extracted = measure(extract, repeat)
+        if extracted["result"] != payload:
+            raise RuntimeError(f"Round trip failed for a {size} byte payload on a {cover['megapixels']} MP cover.")
+
+        results.append(dict(cover, stage="embed", payload_bytes=size, seconds=embedded["seconds"],
+                            bits_per_second=bits / embedded["seconds"], peak_bytes=embedded["peak_bytes"], output_bytes=len(encoded)))
+        results.append(dict(cover, stage="extract", payload_bytes=size, seconds=extracted["seconds"],
+                            bits_per_second=bits / extracted["seconds"], peak_bytes=extracted["peak_bytes"], output_bytes=len(encoded)))
+    return results
+
+
+def run_suite(megapixels:list, payload_sizes:list, repeat:int = 3, warm_cache:bool = False) -> dict:
+    """
+    Run benchmark_cover() on synthetic covers of every size.
+
+    Args:
+        megapixels: cover sizes in megapixels.
+        payload_sizes: payload sizes in bytes.
+        repeat: number of timed runs per measurement.
+        warm_cache: keep level maps cached between runs instead of clearing them.
+
+    Returns:
+        Machine description and the list of results, ready for JSON output.
+    """
+    results = []
+    for size in megapixels:
+        # 4:3 landscape covers, like most camera photos
+        height = int((size * 1e6 * 3 / 4) ** 0.5)
+        image = synthetic_cover(height, int(size * 1e6 / height))
+        results.extend(benchmark_cover(image, payload_sizes, repeat, warm_cache))
+        del image
+    return {"machine": machine_info(), "results": results}
+
+
+def machine_info() -> dict:
+    """Describe the machine and library versions the benchmark ran on."""
+    return {
+        **benchmark_report.machine_info(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "tile_workers": stegano.tile_workers,
+        "low_memory_stripe_rows": stegano.low_memory_stripe_rows,
+    }
+
+
+def benchmark_encoders(image:np.ndarray, payload:bytes, repeat:int = 3) -> list:
+    """
+    Embed a payload once, then time every encoder setting on the stego image.
+
+    Args:
+        image: numpy array of the BGR cover image.
+        payload: bytes to embed.
+        repeat: number of timed encodes per setting; the fastest one is reported.
+
+    Returns:
+        One dict per setting with encode time, output size and round-trip result.
+    """
+    stego_image = image.copy()
+    stegano.embed_image(stego_image, payload)
+
+    results = []
+    for encoder, compression in ENCODER_SETTINGS:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            encoded = stegano.encode_image(stego_image, encoder, compression)
+            timings.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        round_trip = stegano.extract_from_bytes(encoded) == payload
+        decode_seconds = time.perf_counter() - start
+
+        results.append({
+            "encoder": encoder,
+            "compression": compression,
+            "encode_seconds": min(timings),
+            "extract_seconds": decode_seconds,
+            "bytes": len(encoded),
+            "round_trip": round_trip,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="StealthCode steganography benchmarks.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    suite = subparsers.add_parser("suite", help="embed, extract and Sobel timings across cover and payload sizes")
+    suite.add_argument("--megapixels", type=float, nargs="+", default=SUITE_MEGAPIXELS, help="synthetic cover sizes")
+    suite.add_argument("--payloads", type=int, nargs="+", default=SUITE_PAYLOADS, help="payload sizes in bytes")
+    suite.add_argument("--repeat", type=int, default=3, help="timed runs per measurement")
+    suite.add_argument("--warm-cache", action="store_true", help="keep level maps cached between runs")
+    suite.add_argument("--json", help="write results as JSON to this path, '-' for stdout")
+
+    encoders = subparsers.add_parser("encoders", help="encode time against output size for every encoder")
+    encoders.add_argument("--image", help="cover image to use instead of a synthetic one")
+    encoders.add_argument("--megapixels", type=float, default=2.0, help="size of the synthetic cover")
+    encoders.add_argument("--payload", type=int, default=4096, help="payload size in bytes")
+    encoders.add_argument("--repeat", type=int, default=3, help="timed runs per measurement")
+    encoders.add_argument("--json", help="write results as JSON to this path, '-' for stdout")
+    args = parser.parse_args()
+
+    if args.command == "suite":
+        data = run_suite(args.megapixels, args.payloads, args.repeat, args.warm_cache)
+        if args.json:
+            write_json(data, args.json)
+        if args.json != "-":
+            print_table(data["results"], ["megapixels", "stage", "payload_bytes", "seconds", "bits_per_second", "peak_bytes", "output_bytes"])
+        return
+
+    if args.image:
+        image = cv2.imread(args.image)
+        if image is None:
+            raise SystemExit(f"Image not found or format not supported: {args.image}")
+    else:
+        side = int((args.megapixels * 1e6) ** 0.5)
+        image = synthetic_cover(side, side)
+
+    payload = os.urandom(args.payload)
+    results = benchmark_encoders(image, payload, args.repeat)
+
+    if args.json:
+        write_json(results, args.json)
+    if args.json != "-":
+        print_table(results, ["encoder", "compression", "encode_seconds", "extract_seconds", "bytes", "round_trip"])
+
+
+if __name__ == "__main__":
+    main()
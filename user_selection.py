@@ -13,9 +13,10 @@ import shutil
 
 
 class StealthCodeApp:
-    def __init__(self, users, current_user):
+    def __init__(self, users, current_user, password=None):
         self.users = users
         self.current_user = current_user
+        self.password = password # unlocks the local keystore
         self.SELECTED_WG0_CONF = None
         self.root = Tk()
         
@@ -132,7 +133,7 @@ class StealthCodeApp:
                 self.root.destroy()
 
                 # Start StealthCodeApp from interface2
-                init = interface.StealthCodeApp(self.current_user, receiver_name, receiver_ip)
+                init = interface.StealthCodeApp(self.current_user, receiver_name, receiver_ip, self.password)
                 init.run()  # Run the second app's GUI in the same thread (blocking)
             else:
                 print("[+]Asking user to select a config file...")
@@ -141,7 +142,7 @@ class StealthCodeApp:
                 if self.SELECTED_WG0_CONF:
                     try:
                         self.root.destroy()
-                        init = interface.StealthCodeApp(self.current_user, receiver_name, receiver_ip)
+                        init = interface.StealthCodeApp(self.current_user, receiver_name, receiver_ip, self.password)
                         init.run()  # Start the second app
                     except subprocess.CalledProcessError as e:
                         print(f"[ERROR] Failed to move config or start interface: {e}")
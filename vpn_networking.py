@@ -114,8 +114,13 @@ def user_ip_retrieval(receiver_username: str):
         print("Unexpected response format from server.")
         return None
 
-def get_public_key(receiver_username: str):
-    """Retrieve the public key of the receiver."""
+def get_public_key(receiver_username: str, with_algorithm: bool = False):
+    """
+    Retrieve the public key of the receiver.
+
+    With with_algorithm, return (public_key, algorithm) so the sender encapsulates
+    with the receiver's KEM; registries that predate the algorithm field report Kyber1024.
+    """
     data = {"receiver_name": receiver_username}
     public_key_url = f"{URL}/get_public_key"
 
@@ -126,6 +131,8 @@ def get_public_key(receiver_username: str):
         if receiver_public_key:
             print("Receiver Found!")
             print("Receiver public key found:", receiver_public_key)
+            if with_algorithm:
+                return receiver_public_key, response.json().get("receiver_algorithm", "Kyber1024")
             return receiver_public_key
         else:
             print("Receiver public key not found or unexpected response format.")
@@ -138,9 +145,9 @@ def get_public_key(receiver_username: str):
         return None
 
 
-def send_public_key(public_key, username):
-    """Send the public key of the user to update it in the database."""
-    data = {"username": username, "public_key": public_key}
+def send_public_key(public_key, username, algorithm="Kyber1024"):
+    """Send the public key of the user and its KEM algorithm to update them in the database."""
+    data = {"username": username, "public_key": public_key, "algorithm": algorithm}
     public_key_url = f"{URL}/add_public_key"
 
     try: